@@ -0,0 +1,147 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype
+
+import data_processor
+
+try:
+    import pyarrow as pa
+except ImportError:  # pyarrow es opcional: solo lo necesita el backend 'arrow'
+    pa = None
+
+
+def encode_column(column):
+    """
+    Dictionary-encodes a column with Arrow (without going through Python objects for the Arrow-backed strings
+    of pandas).
+
+    Args:
+    column (pd.Series): Column of df2_data.
+
+    Returns:
+    codes (np.ndarray): Position of every value in uniques, -1 for NaN.
+    uniques (list): Distinct values, in order of first appearance.
+    Returns None if Arrow cannot convert the column (for example, mixed types).
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return None
+    try:
+        array = pa.array(column, from_pandas=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        return None
+    chunks = array.chunks if isinstance(array, pa.ChunkedArray) else [array]
+    encoded = pa.chunked_array(chunks, type=array.type).dictionary_encode().unify_dictionaries()
+    if not encoded.num_chunks:
+        return np.empty(0, dtype=np.intp), []
+    codes = np.concatenate([chunk.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+                            for chunk in encoded.chunks]).astype(np.intp)
+    return codes, encoded.chunk(0).dictionary.to_pylist()
+
+
+def profile_encoded(column, codes, uniques):
+    """
+    Arrow version of data_processor.profile_column for text columns: pd.to_numeric runs only on the distinct
+    values and the result is spread to the rows with their codes.
+
+    Args:
+    column (pd.Series): Column of df2_data.
+    codes (np.ndarray): Codes returned by encode_column.
+    uniques (list): Distinct values returned by encode_column.
+
+    Returns:
+    profile (dict): The same dictionary as data_processor.profile_column, or None if the column has to go
+        through pandas.
+    """
+    numbers = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce')
+    if not is_numeric_dtype(numbers):
+        return None
+    missing = codes == -1
+    if missing.any() or numbers.isna().any():
+        lookup = np.append(numbers.to_numpy(dtype=np.float64), np.nan)
+    else:
+        lookup = numbers.to_numpy()
+    values = pd.Series(lookup[codes], index=column.index, name=column.name)
+    #OMITIR 'na' CUANDO tenga significado diferente a null/NaN
+    na_codes = [n for n, value in enumerate(uniques) if value == 'na']
+    nulls = int(missing.sum()) + int(np.isin(codes, na_codes).sum())
+    numeric = int(values.notna().sum())
+    return {'numeric': numeric, 'string': len(column) - nulls - numeric, 'null': nulls,
+            'min': values.min(), 'max': values.max(), 'values': values}
+
+
+def column_kernels(df2_data, column_name, mappings, profile):
+    """
+    Runs every kernel of one source column over a single dictionary encoding: the recodes of its mappings
+    (data_processor.recode_codes) and, if it is copied, its profile (profile_encoded).
+
+    Args:
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    column_name (str): Source column.
+    mappings (dict): repr(how_recode) -> how_recode of the recodes of the column.
+    profile (bool): If True, the column is profiled for copy.
+
+    Returns:
+    recoded (dict): (column_name, repr(how_recode)) -> (recoded column, validation report).
+    column_profile (dict): Profile of the column for copy, or None if it is left to pandas.
+    """
+    column = df2_data[column_name]
+    if profile and is_numeric_dtype(column):
+        return {}, None  # profile_column ya es vectorizado para columnas numericas
+    encoded = encode_column(column)
+    if encoded is None:
+        return {}, None
+    codes, uniques = encoded
+    recoded = {}
+    for key, how_recode in mappings.items():
+        result = data_processor.recode_codes(codes[None, :], uniques, how_recode, [column])
+        recoded[(column_name, key)] = result[column_name]
+    column_profile = profile_encoded(column, codes, uniques) if profile else None
+    return recoded, column_profile
+
+
+def compute_plan(plan, df2_data, categorical=False, jobs=None):
+    """
+    Evaluates the recode and copy kernels of the whole plan before the actions are applied: every source
+    column is dictionary-encoded once with Arrow, and its recodes and profile are computed on the codes.
+    data_processor.apply_actions then takes these results instead of computing them, so the dataframe, the
+    Data-Dictionary and the validation counts are the same as with the pandas backend.
+    The columns are spread over a thread pool, but only the Arrow encoding releases the GIL; the NumPy and
+    Python work on the codes runs mostly one column at a time.
+    Recodes of columns that a copy rewrites, and the recodes of categorical mode, are left to pandas.
+
+    Args:
+    plan (list): Plan returned by data_processor.compile_instructions.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    categorical (bool): If True, recodes are built by data_processor.recode_categorical.
+    jobs (int): Number of threads. Defaults to the number of CPUs.
+
+    Returns:
+    recoded (dict): (column, repr(how_recode)) -> (recoded column, validation report), see data_processor.recode.
+    profiles (dict): Column -> profile of the copied columns, see data_processor.copy.
+    """
+    if pa is None:
+        raise ImportError("El backend 'arrow' requiere pyarrow")
+    copied = {field['df2_column_name'] for field in plan if 'copy' in field['action_list']}
+    mappings = {}
+    for field in plan:
+        column_name = field['df2_column_name']
+        if column_name not in df2_data.columns:
+            continue
+        column_mappings = mappings.setdefault(column_name, {})
+        if not categorical and column_name not in copied \
+                and set(field['action_list']) & {'recode', 'recode_extend'}:
+            column_mappings[repr(field['recode'])] = field['recode']
+    tasks = [(column_name, column_mappings, column_name in copied)
+             for column_name, column_mappings in mappings.items() if column_mappings or column_name in copied]
+
+    recoded, profiles = {}, {}
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        for (column_name, _, _), (column_recoded, column_profile) in zip(
+                tasks, executor.map(lambda task: column_kernels(df2_data, *task), tasks)):
+            recoded.update(column_recoded)
+            if column_profile is not None:
+                profiles[column_name] = column_profile
+    return recoded, profiles
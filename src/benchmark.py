@@ -0,0 +1,232 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import tempfile
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import data_processor
+
+DEFAULT_MIX = {'recode': 0.6, 'copy': 0.3, 'new_options': 0.1}
+DEFAULT_SCALES = [(1000, 20), (10000, 100), (100000, 200)]
+
+
+def generate_dataset(out_dir, rows, fields, mix=None, cardinality=5, seed=0):
+    """
+    Writes a synthetic instrucciones.csv, *_datos.csv and *_diccionario.csv set with the structure of the
+    real files, for benchmarks.
+
+    Args:
+    out_dir (str): Directory where the files are written.
+    rows (int): Number of rows of the data files.
+    fields (int): Number of instruction rows (unified fields).
+    mix (dict): Share of 'recode', 'copy' and 'new_options' fields. Defaults to DEFAULT_MIX.
+    cardinality (int): Number of distinct answers of the categorical columns.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    fnames (dict): Paths of the 'instructions', 'df1_data', 'df1_dict', 'df2_data' and 'df2_dict' files.
+    """
+    mix = mix or DEFAULT_MIX
+    rng = np.random.default_rng(seed)
+    kinds = rng.choice(list(mix), size=fields, p=np.array(list(mix.values())) / sum(mix.values()))
+    answers = np.array([f'respuesta {n}' for n in range(cardinality)] + ['NS/NC'], dtype=object)
+    how_recode = {answer: n + 1 for n, answer in enumerate(answers[:-1])}
+    how_recode['NS/NC'] = 99
+    options = {'options': {code: f'opcion {code}' for code in how_recode.values()}, 'is_category': 'true'}
+
+    instructions = []
+    df1_columns, df2_columns = {}, {}
+    dict1, dict2 = [], []
+    for n, kind in enumerate(kinds):
+        code_2014, code_fmed = f'p{n}_2014', f'p{n}_fmed'
+        if kind == 'recode':
+            acciones = {'actions': ['recode'], 'recode': how_recode}
+            value_options = options
+            for columns in (df1_columns, df2_columns):
+                columns[code_2014 if columns is df1_columns else code_fmed] = rng.choice(answers, size=rows)
+        elif kind == 'copy':
+            acciones = {'actions': ['copy']}
+            value_options = None
+            for columns in (df1_columns, df2_columns):
+                values = rng.normal(40, 15, size=rows).round(1).astype(str).astype(object)
+                values[rng.random(rows) < 0.05] = 'na'
+                values[rng.random(rows) < 0.05] = np.nan
+                columns[code_2014 if columns is df1_columns else code_fmed] = values
+        else:
+            acciones = {'actions': ['copy', 'new_options'], 'new_options': {1: 'si', 2: 'no'}}
+            value_options = None
+            for columns in (df1_columns, df2_columns):
+                columns[code_2014 if columns is df1_columns else code_fmed] = rng.choice(
+                    np.array(['texto libre', 'otro texto', 'comentario'], dtype=object), size=rows)
+        category = f'categoria {n % 10}'
+        instructions.append({'campo_unificado': f'campo_{n}', 'subcategoria': category,
+                             'description_2014': f'Pregunta {n} (2014)', 'description_fmed': f'Pregunta {n} (fmed)',
+                             'options': str(value_options) if value_options else np.nan,
+                             'acciones': str(acciones), 'code_2014': code_2014, 'code_fmed_completo': code_fmed})
+        for dictionary, code in ((dict1, code_2014), (dict2, code_fmed)):
+            dictionary.append({'category': category, 'campo_unificado': code, 'description': f'Pregunta {n}',
+                               'options': str(value_options) if value_options else np.nan})
+
+    os.makedirs(out_dir, exist_ok=True)
+    fnames = {name: os.path.join(out_dir, os.path.basename(fname)) for name, fname in
+              (('instructions', data_processor.INSTRUCTIONS_FNAME), ('df1_data', data_processor.DF1_DATA_FNAME),
+               ('df1_dict', data_processor.DF1_DICT_FNAME), ('df2_data', data_processor.DF2_DATA_FNAME),
+               ('df2_dict', data_processor.DF2_DICT_FNAME))}
+    pd.DataFrame(instructions).to_csv(fnames['instructions'], index=False)
+    pd.DataFrame(df1_columns).to_csv(fnames['df1_data'], index=False)
+    pd.DataFrame(df2_columns).to_csv(fnames['df2_data'], index=False)
+    pd.DataFrame(dict1).to_csv(fnames['df1_dict'], index=False)
+    pd.DataFrame(dict2).to_csv(fnames['df2_dict'], index=False)
+    return fnames
+
+
+def best_time(function, repeat=3, setup=None):
+    """
+    Returns the best wall time of `repeat` calls to function, discarding what it prints.
+
+    Args:
+    function (callable): Function to time. It receives the result of setup, if given.
+    repeat (int): Number of calls.
+    setup (callable): Called before every call, outside of the timing.
+
+    Returns:
+    seconds (float): Best wall time.
+    """
+    times = []
+    for _ in range(repeat):
+        args = (setup(),) if setup else ()
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function(*args)
+            times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def benchmark_scale(rows, fields, repeat=3, mix=None, cardinality=5, seed=0):
+    """
+    Times recode, copy, get_distribution, add_to_new_dict and an end-to-end run on a synthetic dataset, and the
+    batch recode of the columns that share a mapping (recode_group, against one recode per column, and
+    end to end with batch_recode=True).
+
+    Args:
+    rows (int): Number of rows of the data files.
+    fields (int): Number of instruction rows.
+    repeat (int): Number of calls per measure; the best one is kept.
+    mix (dict): Share of 'recode', 'copy' and 'new_options' fields.
+    cardinality (int): Number of distinct answers of the categorical columns.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    result (dict): Scale parameters and the seconds of every measure.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        fnames = generate_dataset(tmp, rows, fields, mix, cardinality, seed)
+        df_instructions = pd.read_csv(fnames['instructions'])
+        df2_data = pd.read_csv(fnames['df2_data'])
+        plan = data_processor.compile_instructions(df_instructions, df2_data.columns)
+        recode_field = next((field for field in plan if 'recode' in field['action_list']), None)
+        copy_field = next((field for field in plan if field['action_list'] == ('copy',)), None)
+
+        timings = {}
+        if recode_field:
+            source = recode_field['df2_column_name']
+            how_recode = recode_field['recode']
+            timings['recode'] = best_time(lambda: data_processor.recode(
+                df2_data, {}, 'nuevo', source, recode_field['actions']), repeat)
+            df2_data_new = pd.DataFrame({'nuevo': df2_data[source].map(how_recode)})
+            timings['get_distribution'] = best_time(lambda: data_processor.get_distribution(
+                df2_data, df2_data_new, source, 'nuevo', how_recode), repeat)
+            # generate_dataset usa el mismo mapeo en todos los campos recode
+            group = [field['df2_column_name'] for field in plan if field['action_list'] == ('recode',)]
+            timings['recode_columns'] = best_time(lambda: [data_processor.recode(
+                df2_data, {}, 'nuevo', name, recode_field['actions']) for name in group], repeat)
+            timings['recode_group'] = best_time(lambda: data_processor.recode_group(df2_data, group, how_recode),
+                                                repeat)
+        if copy_field:
+            source = copy_field['df2_column_name']
+            timings['copy'] = best_time(lambda frame: data_processor.copy(frame, {}, 'nuevo', source, {}), repeat,
+                                        setup=lambda: df2_data[[source]].copy())
+        timings['add_to_new_dict'] = best_time(lambda: [
+            data_processor.add_to_new_dict(df2_dict_new, field['new_column_name'], field['description_final'],
+                                           str(field['value_options']), field['category'])
+            for df2_dict_new in [data_processor.create_dict()] for field in plan], repeat)
+
+        def end_to_end(batch_recode=False):
+            data = pd.read_csv(fnames['df2_data'])
+            data_processor.run_instructions(pd.read_csv(fnames['instructions']), data, batch_recode=batch_recode)
+        timings['end_to_end'] = best_time(end_to_end, repeat)
+        timings['end_to_end_batch'] = best_time(lambda: end_to_end(batch_recode=True), repeat)
+
+    return {'rows': rows, 'fields': fields, 'cardinality': cardinality, 'mix': mix or DEFAULT_MIX,
+            'seconds': timings}
+
+
+def run_benchmarks(scales=None, repeat=3, cardinality=5, seed=0):
+    """
+    Runs benchmark_scale for every (rows, fields) scale.
+
+    Args:
+    scales (list): (rows, fields) pairs. Defaults to DEFAULT_SCALES.
+    repeat (int): Number of calls per measure.
+    cardinality (int): Number of distinct answers of the categorical columns.
+    seed (int): Seed of the random generator.
+
+    Returns:
+    report (dict): Environment information and the result of every scale.
+    """
+    results = []
+    for rows, fields in scales or DEFAULT_SCALES:
+        results.append(benchmark_scale(rows, fields, repeat, cardinality=cardinality, seed=seed))
+        print(f'{rows} filas x {fields} campos: {results[-1]["seconds"]}')
+    return {'date': datetime.now(timezone.utc).isoformat(), 'python': platform.python_version(),
+            'pandas': pd.__version__, 'numpy': np.__version__, 'machine': platform.machine(), 'results': results}
+
+
+def compare(report, baseline):
+    """
+    Prints the ratio between the times of two reports for the scales present in both.
+
+    Args:
+    report (dict): Report of the current version.
+    baseline (dict): Report of the version to compare with.
+    """
+    previous = {(result['rows'], result['fields']): result['seconds'] for result in baseline['results']}
+    for result in report['results']:
+        old = previous.get((result['rows'], result['fields']))
+        if old is None:
+            continue
+        for name, seconds in result['seconds'].items():
+            if name in old and seconds:
+                print(f'{result["rows"]}x{result["fields"]} {name}: {old[name]:.4f}s -> {seconds:.4f}s '
+                      f'({old[name] / seconds:.2f}x)')
+
+
+def parse_scales(text):
+    """Parses scales written as 'ROWSxFIELDS,ROWSxFIELDS'."""
+    return [tuple(int(value) for value in scale.split('x')) for scale in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks del recodificador con datos sinteticos.')
+    parser.add_argument('--scales', type=parse_scales, default=DEFAULT_SCALES,
+                        help="Escalas como '1000x20,100000x200' (filas x campos).")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--cardinality', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help='Reporte JSON de otra version para comparar.')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scales, args.repeat, args.cardinality, args.seed)
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
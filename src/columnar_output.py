@@ -0,0 +1,154 @@
+import json
+
+import numpy as np
+import pandas as pd
+
+import data_processor
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow es opcional: solo lo necesitan write_columnar y read_columnar
+    pa = None
+
+DICTIONARY_KEY = b'data_dictionary'
+FIELD_KEY = b'field'
+
+
+def encode_value(value):
+    """
+    Converts an options value to JSON-compatible objects keeping the type of the dictionary keys
+    (JSON only has string keys): dictionaries are written as {'__dict__': [[key, value], ...]}.
+    """
+    if isinstance(value, dict):
+        return {'__dict__': [[encode_value(key), encode_value(item)] for key, item in value.items()]}
+    if isinstance(value, (list, tuple, set)):
+        return [encode_value(item) for item in value]
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and value != value:
+        return None
+    return value
+
+
+def decode_value(value):
+    """Inverse of encode_value."""
+    if isinstance(value, dict) and '__dict__' in value:
+        return {decode_value(key): decode_value(item) for key, item in value['__dict__']}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+
+def typed_column(column, options):
+    """
+    Gives a recoded column the type declared by its Data-Dictionary options: categorical fields whose values are
+    all keys of 'options' become pd.Categorical with those keys as categories, and copy fields with 'min'/'max'
+    are downcast. Other columns (for example, the free text of a copy + new_options field) are returned
+    unchanged.
+
+    Args:
+    column (pd.Series): Recoded column.
+    options (dict): Options of the field.
+
+    Returns:
+    column (pd.Series): Typed column.
+    """
+    if isinstance(options.get('options'), dict):
+        categories = list(options['options'])
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            present = column.cat.categories[column.cat.codes[column.cat.codes >= 0].unique()]
+            if all(value in categories for value in present):
+                return column.cat.set_categories(categories)
+            return column
+        if all(value in categories for value in pd.unique(column.dropna())):
+            return pd.Series(pd.Categorical(column, categories=categories), index=column.index, name=column.name)
+        return column
+    if 'min' in options and 'max' in options and pd.api.types.is_numeric_dtype(column):
+        return data_processor.downcast_numeric(column, options['min'], options['max'])
+    return column
+
+
+def write_columnar(df2_data_new, df2_dict_new, fname, file_format=None):
+    """
+    Writes the recoded dataset as Parquet or Feather with the types of its Data-Dictionary (see typed_column).
+    The Data-Dictionary is embedded as structured JSON in the schema metadata ('data_dictionary') and in the
+    metadata of every field ('field'), instead of Python repr strings.
+
+    Args:
+    df2_data_new (pd.DataFrame): Recoded dataframe.
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded dataframe.
+    fname (str): Path of the file to write.
+    file_format (str): 'parquet' or 'feather'. By default it is taken from the extension of fname.
+
+    Returns:
+    table (pyarrow.Table): Table written.
+    """
+    if pa is None:
+        raise ImportError('write_columnar requiere pyarrow')
+    file_format = file_format or ('feather' if fname.endswith(('.feather', '.arrow')) else 'parquet')
+
+    registers = []
+    columns = {}
+    options_by_field = {}
+    for category, code, description, options in df2_dict_new[
+            ['category', 'campo_unificado', 'description', 'options']].itertuples(index=False, name=None):
+        options = data_processor.parse_options(options)
+        options_by_field[code] = options
+        registers.append({'category': encode_value(category), 'campo_unificado': code,
+                          'description': encode_value(description), 'options': encode_value(options)})
+    for name in df2_data_new.columns:
+        columns[name] = typed_column(df2_data_new[name], options_by_field.get(name, {}))
+
+    table = pa.Table.from_pandas(pd.DataFrame(columns, index=df2_data_new.index), preserve_index=False)
+    registers_by_field = {register['campo_unificado']: register for register in registers}
+    fields = [field.with_metadata({FIELD_KEY: json.dumps(registers_by_field[field.name]).encode()})
+              if field.name in registers_by_field else field for field in table.schema]
+    metadata = dict(table.schema.metadata or {})
+    metadata[DICTIONARY_KEY] = json.dumps(registers).encode()
+    table = table.cast(pa.schema(fields, metadata=metadata))
+
+    if file_format == 'feather':
+        feather.write_feather(table, fname)
+    else:
+        pq.write_table(table, fname)
+    return table
+
+
+def read_columnar(fname, columns=None):
+    """
+    Reads a file written by write_columnar with memory mapping.
+
+    Args:
+    fname (str): Path of the Parquet or Feather file.
+    columns (list): Columns to read. By default, all of them.
+
+    Returns:
+    df_data (pd.DataFrame): Recoded dataframe.
+    df_dict (pd.DataFrame): Data-Dictionary dataframe, with the options as dictionaries.
+    """
+    if pa is None:
+        raise ImportError('read_columnar requiere pyarrow')
+    if fname.endswith(('.feather', '.arrow')):
+        table = feather.read_table(fname, columns=columns, memory_map=True)
+        registers = json.loads(table.schema.metadata[DICTIONARY_KEY])
+    else:
+        schema = pq.read_schema(fname, memory_map=True)
+        registers = json.loads(schema.metadata[DICTIONARY_KEY])
+        # Parquet solo devuelve como diccionario las columnas de texto que se le piden
+        categorical = [field.name for field in schema if pa.types.is_dictionary(field.type)]
+        table = pq.read_table(fname, columns=columns, memory_map=True, read_dictionary=categorical)
+    registers = [{key: decode_value(value) for key, value in register.items()} for register in registers]
+    if columns is not None:
+        registers = [register for register in registers if register['campo_unificado'] in columns]
+    df_dict = pd.DataFrame(registers, columns=data_processor.create_dict().columns)
+
+    df_data = table.to_pandas()
+    for register in registers:
+        name = register['campo_unificado']
+        # las categoricas con categorias numericas se guardan en Parquet como numeros
+        if name in df_data.columns and isinstance(register['options'].get('options'), dict) \
+                and not isinstance(df_data[name].dtype, pd.CategoricalDtype):
+            df_data[name] = typed_column(df_data[name], register['options'])
+    return df_data, df_dict
@@ -1,7 +1,18 @@
 import pandas as pd
-from pandas.api.types import is_numeric_dtype
+from pandas.api.types import is_numeric_dtype, is_integer_dtype
 import numpy as np
 import ast
+import hashlib
+import importlib.util
+import io
+import os
+import pickle
+import sys
+
+try:
+    import resource
+except ImportError:  # no existe en Windows; peak_memory regresa None
+    resource = None
 
 #PATH = "~/Documents/git/gitlab/conductome-data-processing/"
 PATH = "/Users/noeag/Documents/Git/gitc3/conductome-data-processing/"
@@ -10,14 +21,22 @@ DF1_DATA_FNAME = "fmed-to-2014/data/2014_datos.csv"
 DF1_DICT_FNAME = "fmed-to-2014/data/2014_diccionario.csv"
 DF2_DATA_FNAME = "fmed-to-2014/data/fmed_datos.csv"
 DF2_DICT_FNAME = "fmed-to-2014/data/fmed_diccionario.csv"
+PLAN_CACHE_DIRNAME = "fmed-to-2014/cache/"
+FIELD_CACHE_DIRNAME = "fmed-to-2014/cache/fields/"
+SNAPSHOT_CACHE_DIRNAME = "fmed-to-2014/cache/snapshots/"
+
+VERBOSE = True  # False omite los mensajes de las acciones (y su construccion)
+_RECORDER = None  # instrumentacion activa, ver instrumentation.instrument()
 
 
-def read_data():
+def read_data(pruned=False):
     """
     Reads the data from the files and returns four dataframes.
 
     Args:
     PATH (str): Path to the directory containing the data files.
+    pruned (bool): If True, the instructions are read first and only the source columns they use are loaded,
+        with the dtypes declared in the Data-Dictionaries (see read_source).
 
     Returns:
     df1_dict (pd.DataFrame): Data-Dictionary dataframe 1.
@@ -25,6 +44,13 @@ def read_data():
     df_instructions (pd.DataFrame): Instructions dataframe.
     df2_data (pd.DataFrame): Data dataframe 2.
     """
+    if pruned:
+        df_instructions = pd.read_csv(PATH + INSTRUCTIONS_FNAME)
+        df1_dict = pd.read_csv(PATH + DF1_DICT_FNAME)
+        df2_dict = pd.read_csv(PATH + DF2_DICT_FNAME)
+        df1_data = read_source(PATH + DF1_DATA_FNAME, df_instructions, 'code_2014', df1_dict)
+        df2_data = read_source(PATH + DF2_DATA_FNAME, df_instructions, 'code_fmed_completo', df2_dict)
+        return df1_dict, df1_data, df_instructions, df2_data
     df1_dict = pd.read_csv(PATH + DF1_DICT_FNAME)
     df1_data = pd.read_csv(PATH + DF1_DATA_FNAME)
     df_instructions = pd.read_csv(PATH + INSTRUCTIONS_FNAME)
@@ -32,6 +58,94 @@ def read_data():
     return df1_dict, df1_data, df_instructions, df2_data
 
 
+def read_csv_fast(fname, **kwargs):
+    """
+    Reads a CSV with the multithreaded pyarrow parser when it is installed and supports the requested options,
+    and with the default parser otherwise.
+
+    Args:
+    fname (str): Path to the CSV.
+    **kwargs: Arguments for pd.read_csv.
+
+    Returns:
+    df (pd.DataFrame): Dataframe read.
+    """
+    if importlib.util.find_spec('pyarrow') is not None:
+        try:
+            return pd.read_csv(fname, engine='pyarrow', **kwargs)
+        except ValueError:
+            pass  # opcion no soportada por el motor pyarrow
+    return pd.read_csv(fname, **kwargs)
+
+
+def source_dtypes(df_instructions, code_column, df_dict=None, header=None):
+    """
+    Finds the source columns used by the instructions and the dtypes they can be read with.
+    Columns that are only recoded and are categorical in the Data-Dictionary (they have 'options') are read as
+    'category'. Columns that are only copied and have 'min'/'max' in the Data-Dictionary are read with 'na' as
+    a null value, so they are parsed as numbers instead of strings (copy() treats 'na' as null anyway).
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    code_column (str): Column of the instructions with the source codes ('code_2014' or 'code_fmed_completo').
+    df_dict (pd.DataFrame): Data-Dictionary of the source, with the codes in 'campo_unificado'.
+    header (list): Columns of the source file. Codes that are not in it are skipped.
+
+    Returns:
+    usecols (list): Source columns used by the instructions.
+    dtypes (dict): Column -> 'category'.
+    na_values (dict): Column -> ['na'].
+    """
+    actions_by_column = {}
+    for code, actions in df_instructions[[code_column, 'acciones']].itertuples(index=False, name=None):
+        if code != code or (header is not None and code not in header):
+            continue
+        _, actions = convert_to_dict(np.nan, actions)
+        if SOURCE_ACTIONS & set(actions['actions']):
+            actions_by_column.setdefault(code, set()).update(actions['actions'])
+
+    options_by_column = {}
+    if df_dict is not None:
+        for code, value_options in df_dict[['campo_unificado', 'options']].itertuples(index=False, name=None):
+            if code in actions_by_column:
+                options_by_column[code] = parse_options(value_options)
+
+    dtypes, na_values = {}, {}
+    for code, actions in actions_by_column.items():
+        options = options_by_column.get(code, {})
+        if not actions & {'copy'} and isinstance(options.get('options'), dict):
+            dtypes[code] = 'category'
+        elif not actions & {'recode', 'recode_extend'} and 'min' in options and 'max' in options:
+            na_values[code] = ['na']
+    return list(actions_by_column), dtypes, na_values
+
+
+def read_source(fname, df_instructions, code_column, df_dict=None):
+    """
+    Reads only the source columns used by the instructions, with the dtypes of source_dtypes.
+    The categories of 'category' columns are converted to numbers when they all are, as pd.read_csv would
+    have inferred them, so the recode keys match.
+
+    Args:
+    fname (str): Path to the source CSV.
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    code_column (str): Column of the instructions with the source codes ('code_2014' or 'code_fmed_completo').
+    df_dict (pd.DataFrame): Data-Dictionary of the source.
+
+    Returns:
+    df_data (pd.DataFrame): Data dataframe with the used columns.
+    """
+    header = pd.read_csv(fname, nrows=0).columns
+    usecols, dtypes, na_values = source_dtypes(df_instructions, code_column, df_dict, header)
+    df_data = read_csv_fast(fname, usecols=usecols, dtype=dtypes, na_values=na_values)
+    for code in dtypes:
+        categories = df_data[code].cat.categories
+        numeric = pd.to_numeric(categories, errors='coerce')
+        if len(categories) and not numeric.isna().any() and numeric.is_unique:
+            df_data[code] = df_data[code].cat.rename_categories(numeric)
+    return df_data[usecols]
+
+
 def create_dict():
     """
     Generate an empty dataframe with a Data-Dictionary structure.
@@ -100,6 +214,49 @@ def convert_to_dict(value_options, actions):
 
     return value_options, actions
 
+NUMPY_SCALARS = {'int8', 'int16', 'int32', 'int64', 'uint8', 'uint16', 'uint32', 'uint64', 'float16', 'float32',
+                 'float64', 'bool', 'bool_', 'str_'}
+
+
+def parse_options(options):
+    """
+    Reads the string representation of an options dictionary as written by apply_actions (str(options_updated)).
+    Besides Python literals it accepts the NumPy scalars (np.float64(20.0), np.int64(3)) and nan/inf that
+    str() writes for the 'min'/'max' of copy, which ast.literal_eval rejects.
+
+    Args:
+    options (str): String representation of the options, or NaN.
+
+    Returns:
+    options (dict): Options dictionary (empty if options are missing).
+    """
+    if isinstance(options, dict):
+        return options
+    if options != options:
+        return {}
+
+    def literal(node):
+        if isinstance(node, ast.Constant):
+            return node.value
+        if isinstance(node, ast.Dict):
+            return {literal(key): literal(value) for key, value in zip(node.keys, node.values)}
+        if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+            values = [literal(element) for element in node.elts]
+            return {ast.List: list, ast.Tuple: tuple, ast.Set: set}[type(node)](values)
+        if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd)):
+            value = literal(node.operand)
+            return -value if isinstance(node.op, ast.USub) else value
+        if isinstance(node, ast.Name) and node.id in ('nan', 'inf'):
+            return float(node.id)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and len(node.args) == 1 \
+                and isinstance(node.func.value, ast.Name) and node.func.value.id in ('np', 'numpy') \
+                and node.func.attr in NUMPY_SCALARS:
+            return getattr(np, node.func.attr)(literal(node.args[0]))
+        raise ValueError(f'Opciones no validas: {options}')
+
+    return literal(ast.parse(options.strip(), mode='eval').body)
+
+
 def add_to_dict(actions, value_options):
     """
     Adds new options to an existing dictionary.
@@ -116,12 +273,12 @@ def add_to_dict(actions, value_options):
     old_options = value_options['options']
     new_options = actions['add_to_dict']
     merged_options = old_options | new_options
-    options_updated = value_options.copy()
-    options_updated['options'].update(merged_options)
+    # Diccionario nuevo: value_options es parte del plan compilado, que se reutiliza entre ejecuciones
+    options_updated = {**value_options, 'options': merged_options}
     return options_updated
 
 
-def recode(df2_data, df2_data_new, new_column_name, df2_column_name, actions):
+def recode(df2_data, df2_data_new, new_column_name, df2_column_name, actions, categories=None, recoded=None):
     """
     Recodes a column of a dataframe using a dictionary mapping and stores the result in a new column.
     
@@ -131,25 +288,37 @@ def recode(df2_data, df2_data_new, new_column_name, df2_column_name, actions):
     - new_column_name (str): Name of the new column.
     - df2_column_name (str): Name of the original column.
     - actions (dict): Mapping dictionary to be used for recoding.
+    - categories (list): If given, the new column is a pd.Categorical built by recode_categorical.
+    - recoded (dict): Precomputed recodes, (column, repr(how_recode)) -> (recoded column, validation report)
+      (see batch_recodes and arrow_backend).
     
     Returns:
     - df2_data_new (pd.DataFrame): Updated dataframe with new column and values recoded.
     """
     how_recode = actions['recode']
-    # Aplicar el mapeo usando el método map
-    df2_data_new[new_column_name] = df2_data[df2_column_name].map(how_recode)
+    key = (df2_column_name, repr(how_recode))
+    if categories is None and recoded is not None and key in recoded:
+        # Columna ya recodificada y validada (junto con las demas columnas de su grupo o por arrow_backend)
+        df2_data_new[new_column_name], report = recoded[key]
+        validacion_recode = report_distribution(how_recode, report)
+    elif categories is None:
+        # Aplicar el mapeo usando el método map
+        df2_data_new[new_column_name] = df2_data[df2_column_name].map(how_recode)
+        validacion_recode = get_distribution(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
+    else:
+        df2_data_new[new_column_name] = recode_categorical(df2_data[df2_column_name], how_recode, categories)
+        validacion_recode = get_distribution(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
 
-    validacion_recode = get_distribution(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
-    
-    if validacion_recode == True:
+    if VERBOSE and validacion_recode == True:
         print('Recodificación EXITOSA')
-    else:
+    elif VERBOSE:
         print('PROBLEMAS en la recodificación')
 
     return df2_data_new
 
 
-def recode_extend(df2_data, df2_data_new, new_column_name, df2_column_name, actions, description_df1):
+def recode_extend(df2_data, df2_data_new, new_column_name, df2_column_name, actions, description_df1,
+                  categories=None, recoded=None):
     """
     Recodes a column of a dataframe using a dictionary mapping and
      stores the result in a new column with an extended description.
@@ -161,51 +330,158 @@ def recode_extend(df2_data, df2_data_new, new_column_name, df2_column_name, acti
         - df2_column_name (str): Name of the original column.
         - actions (dict): Mapping dictionary to be used for recoding.
         - description_df1 (str): Description to be appended to the final description.
+        - categories (list): If given, the new column is a pd.Categorical built by recode_categorical.
+        - recoded (dict): Precomputed recodes, (column, repr(how_recode)) -> (recoded column, validation
+          report) (see batch_recodes and arrow_backend).
     
     Returns:
         - df2_data_new (pd.DataFrame): Updated dataframe with new column and values recoded.
         - description_final (str): Description for the final Data-Dictionary
     """
     how_recode = actions['recode']
-    # Aplicar el mapeo usando el método map
-    df2_data_new[new_column_name] = df2_data[df2_column_name].map(how_recode)
+    key = (df2_column_name, repr(how_recode))
+    if categories is None and recoded is not None and key in recoded:
+        # Columna ya recodificada y validada (junto con las demas columnas de su grupo o por arrow_backend)
+        df2_data_new[new_column_name], report = recoded[key]
+        validacion_recode = report_distribution(how_recode, report)
+    elif categories is None:
+        # Aplicar el mapeo usando el método map
+        df2_data_new[new_column_name] = df2_data[df2_column_name].map(how_recode)
+        validacion_recode = get_distribution(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
+    else:
+        df2_data_new[new_column_name] = recode_categorical(df2_data[df2_column_name], how_recode, categories)
+        validacion_recode = get_distribution(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
     description_final = description_df1
 
-    validacion_recode = get_distribution(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
-    if validacion_recode == True:
+    if VERBOSE and validacion_recode == True:
         print('Recodificación EXITOSA')
-    else:
+    elif VERBOSE:
         print('PROBLEMAS en la recodificación')
 
     return df2_data_new, description_final
 
-def convert_to_numeric(column):
+def option_categories(options_updated):
+    """
+    Returns the categories of a categorical variable: the keys of its 'options' dictionary.
+
+    Args:
+    - options_updated (dict): Options of the variable.
+
+    Returns:
+    - categories (list): Keys of options_updated['options'], or an empty list if there are none.
+    """
+    options = options_updated.get('options') if isinstance(options_updated, dict) else None
+    return list(options) if isinstance(options, dict) else []
+
+
+def recode_categorical(column, how_recode, categories=()):
+    """
+    Recodes a column like column.map(how_recode) but working on codes: the column is factorized once
+    (or its codes are used if it is already categorical), the distinct values are translated through how_recode
+    with a small lookup array and the result is a pd.Categorical. Unmapped keys and NaN give NaN, as with .map.
+
+    Args:
+    - column (pd.Series): Column to recode.
+    - how_recode (dict): Mapping dictionary to be used for recoding.
+    - categories (list): Categories of the result, usually from the options dictionary. Recoded values that are
+        not in the list are appended to the categories in order of appearance.
+
+    Returns:
+    - recoded (pd.Series): Categorical Series with the recoded values and the index of column.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        codes = column.cat.codes.to_numpy()
+        uniques = column.cat.categories
+    else:
+        codes, uniques = pd.factorize(column)  # los NaN quedan con codigo -1
+
+    categories = list(dict.fromkeys(categories))
+    positions = {category: n for n, category in enumerate(categories)}
+    lookup = np.empty(len(uniques) + 1, dtype=np.intp)
+    for n, key in enumerate(uniques):
+        value = how_recode.get(key, np.nan)
+        if value != value:
+            lookup[n] = -1
+            continue
+        if value not in positions:
+            positions[value] = len(categories)
+            categories.append(value)
+        lookup[n] = positions[value]
+    lookup[-1] = -1  # codigo -1 (NaN) -> NaN
+
+    recoded = pd.Categorical.from_codes(lookup[codes], categories=categories)
+    return pd.Series(recoded, index=column.index, name=column.name)
+
+
+def profile_column(column):
     """
-    Converts a column in a pandas DataFrame to numeric values if possible.
-    If a value in the column is not numeric, it is kept as a string.
+    Classifies the values of a column in one vectorized pass: a single pd.to_numeric(errors='coerce') gives
+    the numeric values (integers, decimals and negative numbers), and the rest are nulls or strings.
+    The string 'na' is counted as null.
 
     Parameters:
         column (pd.Series): A pandas Series representing a column in a DataFrame.
 
     Returns:
-        updated_column: (pd.Series): A pandas Series with numeric values where possible and strings otherwise.
+        profile (dict): 'numeric', 'string' and 'null' counts, 'min' and 'max' of the numeric values
+            (NaN if there are none) and 'values', the column converted to numbers with NaN for non-numeric values.
     """
-    if is_numeric_dtype(column.dropna()):
-        return column
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        column = column.astype(object)
+    if is_numeric_dtype(column):
+        values = column
+        nulls = values.isna()
+        numeric = len(values) - nulls.sum()
+        string = 0
     else:
-        # Convert the column to a pandas Series to use the str method
-        column_series = pd.Series(column)
-        # Use the str method to check if each value is numeric
-        is_numeric = column_series.str.isnumeric()
-        # Use the pandas to_numeric method to convert numeric values to floats or ints
-        numeric_values = pd.to_numeric(column_series[is_numeric], errors='coerce')
-        # Combine the numeric and non-numeric values back into a single Series
-        result_series = pd.concat([numeric_values, column_series[~is_numeric]])
-        # Return the result as a Series with the original index
-        updated_column = pd.Series(result_series, index=column.index)
-        return updated_column
-
-def copy(df2_data, df2_data_new, new_column_name, df2_column_name, options_updated):
+        values = pd.to_numeric(column, errors='coerce')
+        #OMITIR 'na' CUANDO tenga significado diferente a null/NaN
+        nulls = column.isna() | (column == 'na')
+        numeric = values.notna().sum()
+        string = len(column) - nulls.sum() - numeric
+    return {'numeric': int(numeric), 'string': int(string), 'null': int(nulls.sum()),
+            'min': values.min(), 'max': values.max(), 'values': values}
+
+
+def downcast_numeric(column, minimo, maximo):
+    """
+    Returns a numeric column with the smallest type consistent with its min/max: the narrowest integer type
+    (nullable if there are NaN) when all values are integers, float32 when it keeps every value exactly
+    and float64 otherwise.
+
+    Args:
+    column (pd.Series): Numeric column.
+    minimo (number): Minimum declared in the Data-Dictionary.
+    maximo (number): Maximum declared in the Data-Dictionary.
+
+    Returns:
+    column (pd.Series): Downcast column.
+    """
+    values = column.dropna()
+    if minimo != minimo or maximo != maximo or not len(values):
+        return column
+    if is_integral(values):
+        for dtype in (np.int8, np.int16, np.int32, np.int64):
+            info = np.iinfo(dtype)
+            if info.min <= minimo and maximo <= info.max:
+                if column.isna().any():
+                    return column.astype(pd.api.types.pandas_dtype(dtype.__name__.capitalize()))
+                return column.astype(dtype)
+    as_float32 = values.astype(np.float32)
+    if (as_float32.astype(np.float64) == values.astype(np.float64)).all():
+        return column.astype(np.float32)
+    return column.astype(np.float64)
+
+
+def is_integral(values):
+    """True if every value of a numeric Series without NaN is an integer."""
+    if pd.api.types.is_integer_dtype(values):
+        return True
+    return bool(np.isfinite(values).all() and (values == np.floor(values)).all())
+
+
+def copy(df2_data, df2_data_new, new_column_name, df2_column_name, options_updated, profiles=None,
+         low_memory=False):
     """
     Copies a column of a dataframe to a new column and stores the range of values in a dictionary.
     
@@ -215,38 +491,34 @@ def copy(df2_data, df2_data_new, new_column_name, df2_column_name, options_updat
     - new_column_name (str): Name of the new column.
     - df2_column_name (str): Name of the original column.
     - options_updated (dict): Default options of the variable.
+    - profiles (dict): Precomputed profiles, column -> profile_column result (see arrow_backend).
+    - low_memory (bool): If True, the new column of a column converted from text to numbers is downcast to the
+      narrowest type consistent with its min/max (see downcast_numeric).
     
     Returns:
     - df2_data_new (pd.DataFrame): Updated dataframe with new column and values recoded.
     - options_updated (dict): Dictionary with the minimum and maximum values of the copied column.
     """
-    column = df2_data[df2_column_name]  # Columna con puros strings
-    nan = column.isna().sum()
-    column = convert_to_numeric(column.dropna())  # Columna con strings y numericos ya localizados omite NaN
-    column = column.replace('na', np.nan)  #OMITIR esta linea CUANDO 'na' tenga significado diferente a null/NaN
-    # Count how many values were converted to floats
-    float_count = pd.to_numeric(column, errors='coerce').notna().sum()
-    # Count how many values were kept as strings
-    def count_non_null_strings(x):
-        if isinstance(x, str):
-            return 1
-        else:
-            return 0
-    # Count occurrences of non-null strings in column A
-    string_count = column.apply(count_non_null_strings).sum()
-    # Count how many NaN values there are
-    nan += column.isna().sum()
-    print(f'Numericos: {float_count}')
-    #print(f'Numericos: {float_count},\nStrings: {string_count},\nNulls: {nan}')
+    profile = profiles.get(df2_column_name) if profiles else None
+    if profile is None:
+        profile = profile_column(df2_data[df2_column_name])
+    float_count, string_count = profile['numeric'], profile['string']
+    if VERBOSE:
+        print(f'Numericos: {float_count}')
+    #print(f'Numericos: {float_count},\nStrings: {string_count},\nNulls: {profile["null"]}')
     if float_count >= string_count:
-        print('La columna es numerica y se podra encontrar un maximo y minimo')
-        df2_data[df2_column_name] = pd.to_numeric(df2_data[df2_column_name], errors="coerce")
+        if VERBOSE:
+            print('La columna es numerica y se podra encontrar un maximo y minimo')
+        coerced = not is_numeric_dtype(df2_data[df2_column_name])
+        df2_data[df2_column_name] = profile['values']
         df2_data_new[new_column_name] = df2_data[df2_column_name]
-        maximo = df2_data_new[new_column_name].max()
-        minimo = df2_data_new[new_column_name].min()
-        options_updated = {'min': minimo, 'max': maximo}
+        if low_memory and coerced:
+            # Solo la salida se reduce: las filas siguientes del plan leen la columna float64 de df2_data
+            df2_data_new[new_column_name] = downcast_numeric(profile['values'], profile['min'], profile['max'])
+        options_updated = {'min': profile['min'], 'max': profile['max']}
     else:
-        print(f'La columna es de strings y se quedan las opciones: {options_updated}')
+        if VERBOSE:
+            print(f'La columna es de strings y se quedan las opciones: {options_updated}')
         df2_data_new[new_column_name] = df2_data[df2_column_name]
         options_updated = options_updated
     return df2_data_new, options_updated
@@ -287,7 +559,8 @@ def add_to_new_dict(df2_dict_new, code, description, options, category):
     return df2_dict_new
 
 def apply_actions(df2_data, df2_data_new, new_column_name, description_df1, description_df2, description_final,
-                    value_options, options_updated, actions, df1_column_name, df2_column_name, category):
+                    value_options, options_updated, actions, df1_column_name, df2_column_name, category,
+                    categorical=False, recoded=None, profiles=None, low_memory=False):
     """
     This function performs a set of actions on a given pandas DataFrame column.
     The actions are specified in a dictionary passed as the 'actions' argument.
@@ -306,6 +579,10 @@ def apply_actions(df2_data, df2_data_new, new_column_name, description_df1, desc
     - df1_column_name (str): The name of the column in the first DataFrame.
     - df2_column_name (str): The name of the column in the second DataFrame.
     - category (str): The category of the variable.
+    - categorical (bool): If True, recoded columns are built as pd.Categorical with the categories of the options.
+    - recoded (dict): Precomputed recodes, see recode.
+    - profiles (dict): Precomputed profiles of the copied columns, see copy.
+    - low_memory (bool): If True, copy downcasts the columns it converts to numbers.
     
     Returns:
     - code (str): The name of the modified column.
@@ -314,32 +591,44 @@ def apply_actions(df2_data, df2_data_new, new_column_name, description_df1, desc
     - category (str): The category of the variable.
     """
     for item in actions['actions']:
+        if _RECORDER is not None:
+            _RECORDER.start_action(new_column_name, df2_column_name, item, len(df2_data))
+
         if item == 'add_to_dict':
             # Call add_to_dict function to modify options_updated.
             options_updated = add_to_dict(actions, value_options)
 
         elif item == 'recode':
             # Call recode function to modify df2_data_new and options_updated.
-            df2_data_new = recode(df2_data, df2_data_new, new_column_name, df2_column_name, actions)
+            categories = option_categories(options_updated) if categorical else None
+            df2_data_new = recode(df2_data, df2_data_new, new_column_name, df2_column_name, actions, categories,
+                                  recoded)
 
         elif item == 'recode_extend':
             # Call recode_extend function to modify df2_data_new and options_updated.
+            categories = option_categories(options_updated) if categorical else None
             df2_data_new, description_final = recode_extend(df2_data, df2_data_new, new_column_name, df2_column_name,
-                                                            actions, description_df1)
+                                                            actions, description_df1, categories, recoded)
 
         elif item == 'copy':
             # Call copy function to modify df2_data and df2_data_new, and update options_updated.
-            df2_data_new, options_updated = copy(df2_data, df2_data_new, new_column_name, df2_column_name, options_updated)
+            df2_data_new, options_updated = copy(df2_data, df2_data_new, new_column_name, df2_column_name, options_updated,
+                                                 profiles, low_memory)
 
         elif item == 'new_options':
             # Call new_options function to modify options_updated.
             options_updated = new_options(actions)
 
         elif item == 'especial':
-            print(f"La variable {df2_column_name} requiere un trato especial")
+            if VERBOSE:
+                print(f"La variable {df2_column_name} requiere un trato especial")
 
         else:
-            print(f"La accion solicitada {item} no se encuentra")
+            if VERBOSE:
+                print(f"La accion solicitada {item} no se encuentra")
+
+        if _RECORDER is not None:
+            _RECORDER.end_action()
 
     code = new_column_name
     description = description_final
@@ -349,6 +638,682 @@ def apply_actions(df2_data, df2_data_new, new_column_name, description_df1, desc
     return code, description, options, categoria
 
 
+INSTRUCTION_COLUMNS = ['campo_unificado', 'description_2014', 'description_fmed', 'options', 'acciones',
+                       'code_2014', 'code_fmed_completo', 'subcategoria']
+
+
+def iter_instructions(df_instructions):
+    """
+    Iterates over the instructions dataframe with itertuples and yields the same fields as read_instructions.
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+
+    Yields:
+    tuple: (new_column_name, description_df1, description_df2, description_final, value_options,
+        options_updated, actions, df1_column_name, df2_column_name, category) for every row.
+    """
+    for (new_column_name, description_df1, description_df2, value_options, actions,
+         df1_column_name, df2_column_name, category) in df_instructions[INSTRUCTION_COLUMNS].itertuples(index=False,
+                                                                                                     name=None):
+        description_final = description_df2  # default final description is the fmed one
+        yield new_column_name, description_df1, description_df2, description_final,\
+            value_options, value_options, actions, df1_column_name, df2_column_name, category
+
+
+KNOWN_ACTIONS = {'add_to_dict', 'recode', 'recode_extend', 'copy', 'new_options', 'especial', 'none'}
+SOURCE_ACTIONS = {'recode', 'recode_extend', 'copy'}  # acciones que leen la columna de fmed
+BACKENDS = {'pandas', 'arrow'}  # motores de run_plan
+PLAN_VERSION = 1  # incrementar cuando cambie la estructura del plan para invalidar los planes guardados
+
+
+def compile_instructions(df_instructions, columns=None):
+    """
+    Compiles the instructions dataframe into an execution plan: the options and actions strings are parsed once
+    and every row is validated before any action runs.
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    columns (list): Columns of the source dataframe. If given, the source columns are checked too.
+
+    Returns:
+    plan (list): One dictionary per instruction row with the fields of read_instructions, the parsed
+        'value_options' and 'actions' and the 'action_list', 'recode', 'new_options' and 'add_to_dict' entries.
+
+    Raises:
+    ValueError: If an action is unknown or lacks its parameters, or a source column is missing.
+    """
+    plan = []
+    errors = []
+    for (new_column_name, description_df1, description_df2, description_final, value_options, options_updated,
+         actions, df1_column_name, df2_column_name, category) in iter_instructions(df_instructions):
+        value_options, actions = convert_to_dict(value_options, actions)
+        action_list = tuple(actions['actions'])
+        for item in action_list:
+            if item not in KNOWN_ACTIONS:
+                errors.append(f"{new_column_name}: la accion solicitada {item} no se encuentra")
+            elif item in ('recode', 'recode_extend', 'new_options', 'add_to_dict') \
+                    and item.replace('_extend', '') not in actions:
+                errors.append(f"{new_column_name}: la accion {item} no tiene su diccionario")
+        if 'add_to_dict' in action_list and 'options' not in value_options:
+            errors.append(f"{new_column_name}: add_to_dict requiere 'options' en las opciones")
+        plan.append({'new_column_name': new_column_name, 'description_df1': description_df1,
+                     'description_df2': description_df2, 'description_final': description_final,
+                     'value_options': value_options, 'actions': actions, 'action_list': action_list,
+                     'recode': actions.get('recode'), 'new_options': actions.get('new_options'),
+                     'add_to_dict': actions.get('add_to_dict'), 'df1_column_name': df1_column_name,
+                     'df2_column_name': df2_column_name, 'category': category})
+    if errors:
+        raise ValueError('Instrucciones invalidas:\n' + '\n'.join(errors))
+    if columns is not None:
+        check_plan_columns(plan, columns)
+    return plan
+
+
+def check_plan_columns(plan, columns):
+    """
+    Checks that every source column used by the plan exists in the source dataframe.
+
+    Args:
+    plan (list): Plan returned by compile_instructions.
+    columns (list): Columns of the source dataframe.
+
+    Raises:
+    ValueError: If a source column is missing.
+    """
+    columns = set(columns)
+    missing = [f"{field['new_column_name']}: no existe la columna {field['df2_column_name']}" for field in plan
+               if SOURCE_ACTIONS & set(field['action_list']) and field['df2_column_name'] not in columns]
+    if missing:
+        raise ValueError('Columnas faltantes:\n' + '\n'.join(missing))
+
+
+def load_plan(instructions_fname=PATH + INSTRUCTIONS_FNAME, cache_dir=PATH + PLAN_CACHE_DIRNAME, columns=None):
+    """
+    Returns the compiled plan of an instructions file. The plan is stored in cache_dir under the hash of the
+    file content, so an unchanged instructions file is loaded without parsing it again.
+
+    Args:
+    instructions_fname (str): Path to the instructions CSV.
+    cache_dir (str): Directory where the compiled plans are stored.
+    columns (list): Columns of the source dataframe. If given, the source columns are checked.
+
+    Returns:
+    plan (list): Plan as returned by compile_instructions.
+    """
+    with open(instructions_fname, 'rb') as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    plan_fname = os.path.join(cache_dir, f'plan_v{PLAN_VERSION}_{digest}.pkl')
+    if os.path.exists(plan_fname):
+        with open(plan_fname, 'rb') as f:
+            plan = pickle.load(f)
+    else:
+        plan = compile_instructions(pd.read_csv(io.BytesIO(content)))
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_fname = plan_fname + '.tmp'
+        with open(tmp_fname, 'wb') as f:
+            pickle.dump(plan, f)
+        os.replace(tmp_fname, plan_fname)
+    if columns is not None:
+        check_plan_columns(plan, columns)
+    return plan
+
+
+def recode_group(df2_data, column_names, how_recode):
+    """
+    Recodes several columns that share the same mapping in one vectorized operation: every column is
+    factorized on its own (without an object copy), its distinct values are translated to one table shared by
+    the group, and the columns are recoded and validated by recode_codes with a single lookup array.
+    Every column and report is the same as column.map(how_recode) and validate_recode would give.
+
+    Args:
+    df2_data (pd.DataFrame): Original dataframe.
+    column_names (list): Columns to recode.
+    how_recode (dict): Mapping dictionary to be used for recoding.
+
+    Returns:
+    results (dict): Column name -> (recoded column, validation report).
+    """
+    columns = [df2_data[name] for name in column_names]
+    codes = np.empty((len(columns), len(df2_data)), dtype=np.intp)
+    # (tipo, valor) distinto -> posicion en la tabla compartida; con el tipo, 1 de una columna entera y 1.0
+    # de una columna float quedan separados y cada reporte conserva las llaves de su columna
+    table = {}
+    for j, column in enumerate(columns):
+        column_codes, uniques = pd.factorize(column)  # NaN -> -1
+        # la ultima posicion traduce el -1 (NaN) a -1
+        translate = np.array([table.setdefault((type(value), value), len(table)) for value in list(uniques)]
+                             + [-1], dtype=np.intp)
+        codes[j] = translate[column_codes]
+    return recode_codes(codes, [value for _, value in table], how_recode, columns)
+
+
+def recode_codes(codes, uniques, how_recode, columns):
+    """
+    Recodes columns given as integer codes into their distinct values (the output of pd.factorize or of an
+    Arrow dictionary encoding) and builds their validation reports from np.bincount over the codes.
+    Like column.map(how_recode), the distinct values are looked up in pd.Series(how_recode) and the rows take
+    the result with NaN for the missing keys, so the new columns have the same dtype.
+
+    Args:
+    codes (np.ndarray): (columns, rows) array of positions in uniques, -1 for NaN.
+    uniques (array-like): Distinct values of the columns.
+    how_recode (dict): Mapping dictionary to be used for recoding.
+    columns (list): Original columns, one per row of codes (for their index, name and NaN values).
+
+    Returns:
+    results (dict): Column name -> (recoded column, validation report).
+    """
+    n_columns = len(columns)
+    mapper = pd.Series(how_recode) if how_recode else pd.Series(how_recode, dtype=np.float64)
+    positions = np.append(mapper.index.get_indexer(pd.Index(uniques, dtype=object)), -1)  # -1 (NaN) -> NaN
+    mapped_values = mapper.array if isinstance(mapper.dtype, pd.api.extensions.ExtensionDtype) \
+        else mapper.to_numpy()
+    # Codigo de cada llave del mapeo dentro de los valores distintos (-1 = NaN)
+    value_codes = np.full(len(mapper) + 1, -1, dtype=np.intp)
+    values = {}
+    for n, value in enumerate(mapper.tolist()):
+        if value == value:
+            value_codes[n] = values.setdefault(value, len(values))
+    values = list(values)
+
+    # Conteos de llaves y de valores de todas las columnas con un solo bincount cada uno (0 = NaN)
+    offsets = np.arange(n_columns)[:, None]
+    key_counts = np.bincount((codes + 1 + offsets * (len(uniques) + 1)).ravel(),
+                             minlength=n_columns * (len(uniques) + 1)).reshape(n_columns, -1)
+    recoded_codes = value_codes[positions[codes]]
+    value_counts = np.bincount((recoded_codes + 1 + offsets * (len(values) + 1)).ravel(),
+                               minlength=n_columns * (len(values) + 1)).reshape(n_columns, -1)
+
+    results = {}
+    for j, original in enumerate(columns):
+        column = pd.Series(pd.api.extensions.take(mapped_values, positions[codes[j]], allow_fill=True),
+                           index=original.index, name=original.name)
+        # Etiquetas con el tipo de la nueva columna, como las da value_counts().to_dict()
+        labels = pd.Series(values, dtype=object).astype(column.dtype).tolist() if values else []
+        count_keys = {uniques[n]: int(count) for n, count in enumerate(key_counts[j, 1:]) if count}
+        col2_counts = {labels[n]: int(count) for n, count in enumerate(value_counts[j, 1:]) if count}
+        if key_counts[j, 0]:
+            # value_counts distingue None de NaN en las columnas object
+            count_keys.update(observed_counts(original[original.isna()]) if original.dtype == object
+                              else {np.nan: int(key_counts[j, 0])})
+        if value_counts[j, 0]:
+            col2_counts[np.nan] = int(value_counts[j, 0])
+        # de mayor a menor conteo, como value_counts
+        count_keys = dict(sorted(count_keys.items(), key=lambda item: -item[1]))
+        col2_counts = dict(sorted(col2_counts.items(), key=lambda item: -item[1]))
+        results[original.name] = column, validate_counts(how_recode, count_keys, col2_counts)
+    return results
+
+
+def batch_recodes(plan, df2_data):
+    """
+    Groups the recode/recode_extend rows of a plan by identical mapping and recodes every group with
+    recode_group. Columns that a copy rewrites are left out, since copy changes them during the run.
+
+    Args:
+    plan (list): Plan returned by compile_instructions.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+
+    Returns:
+    recoded (dict): (source column, repr(how_recode)) -> (recoded column, validation report), for the
+        groups with more than one column.
+    """
+    copied = {field['df2_column_name'] for field in plan if 'copy' in field['action_list']}
+    groups = {}
+    for field in plan:
+        if set(field['action_list']) & {'recode', 'recode_extend'} and field['df2_column_name'] not in copied:
+            how_recode, column_names = groups.setdefault(repr(field['recode']), (field['recode'], []))
+            if field['df2_column_name'] not in column_names:
+                column_names.append(field['df2_column_name'])
+
+    recoded = {}
+    for key, (how_recode, column_names) in groups.items():
+        if len(column_names) > 1:
+            for name, result in recode_group(df2_data, column_names, how_recode).items():
+                recoded[(name, key)] = result
+    return recoded
+
+
+def run_plan(plan, df2_data, categorical=False, batch_recode=False, backend='pandas', low_memory=False):
+    """
+    Applies a compiled plan to df2_data and builds the recoded dataframe and its Data-Dictionary at the end,
+    with a single DataFrame construction each.
+
+    Args:
+    plan (list): Plan returned by compile_instructions or load_plan.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    categorical (bool): If True, recoded columns are built as pd.Categorical (see recode_categorical).
+    batch_recode (bool): If True, columns that share the same recode mapping are recoded together
+        (see batch_recodes).
+    backend (str): Engine of the recode and copy kernels, 'pandas' (default) or 'arrow' (see arrow_backend).
+        Both give the same dataframe and Data-Dictionary.
+    low_memory (bool): If True, the run keeps one copy of every column: copied columns share their buffers
+        with df2_data, columns converted to numbers are downcast (see downcast_numeric), the source columns are
+        dropped from df2_data after the last instruction that reads them and the peak memory is reported
+        (see peak_memory). The Data-Dictionary is the same; only the numeric types of the data change.
+
+    Returns:
+    df2_data_new (pd.DataFrame): Recoded dataframe.
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded dataframe.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Backend desconocido: {backend}. Opciones: {sorted(BACKENDS)}')
+    if backend == 'arrow':
+        import arrow_backend  # pyarrow es opcional
+        recoded, profiles = arrow_backend.compute_plan(plan, df2_data, categorical)
+    else:
+        recoded = batch_recodes(plan, df2_data) if batch_recode and not categorical else None
+        profiles = None
+    # Ultima fila del plan que lee cada columna de fmed (low_memory la libera despues)
+    last_use = {field['df2_column_name']: n for n, field in enumerate(plan)
+                if SOURCE_ACTIONS & set(field['action_list'])} if low_memory else {}
+    index = df2_data.index
+    new_columns = {}  # las acciones escriben aqui sus columnas; el DataFrame se arma una sola vez al final
+    registers = []
+    for n, field in enumerate(plan):
+        code, description, options, categoria = apply_actions(df2_data, new_columns, field['new_column_name'],
+                                                               field['description_df1'], field['description_df2'],
+                                                               field['description_final'], field['value_options'],
+                                                               field['value_options'], field['actions'],
+                                                               field['df1_column_name'], field['df2_column_name'],
+                                                               field['category'], categorical, recoded, profiles,
+                                                               low_memory)
+        registers.append({'category': categoria, 'campo_unificado': code, 'description': description,
+                          'options': options})
+        if last_use.get(field['df2_column_name']) == n and field['df2_column_name'] in df2_data.columns:
+            del df2_data[field['df2_column_name']]
+
+    # copy=False: las columnas copiadas comparten memoria con sus fuentes en lugar de duplicarse
+    df2_data_new = pd.DataFrame(new_columns, index=index, copy=not low_memory)
+    df2_dict_new = pd.DataFrame(registers, columns=create_dict().columns)
+    if low_memory:
+        peak = peak_memory()
+        if VERBOSE and peak is not None:
+            print(f'Memoria pico del proceso: {peak / 2 ** 20:.1f} MB')
+        if _RECORDER is not None:
+            _RECORDER.memory(peak)
+    return df2_data_new, df2_dict_new
+
+
+def peak_memory():
+    """
+    Returns the peak resident memory of the process in bytes (ru_maxrss), which includes the buffers of numpy
+    and Arrow. Returns None where the resource module does not exist (Windows).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024  # macOS la da en bytes, Linux en KB
+
+
+def run_instructions(df_instructions, df2_data, categorical=False, batch_recode=False, backend='pandas',
+                     low_memory=False):
+    """
+    Compiles the instructions dataframe and applies it to df2_data (see run_plan).
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    categorical (bool): If True, recoded columns are built as pd.Categorical (see recode_categorical).
+    batch_recode (bool): If True, columns that share the same recode mapping are recoded together.
+    backend (str): 'pandas' (default) or 'arrow'.
+    low_memory (bool): If True, one copy per column and columns of df2_data dropped after their last use.
+
+    Returns:
+    df2_data_new (pd.DataFrame): Recoded dataframe.
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded dataframe.
+    """
+    return run_plan(compile_instructions(df_instructions, df2_data.columns), df2_data, categorical, batch_recode,
+                    backend, low_memory)
+
+
+SOURCES = {'2014': 'df1_column_name', 'fmed': 'df2_column_name'}  # etiqueta de cada fuente -> columna del plan
+
+
+def merge_options(options_list):
+    """
+    Merges the options that the same unified field got in several sources: the ranges of copy are joined
+    ({'min': smallest min, 'max': largest max}); otherwise the last options are kept.
+
+    Args:
+    options_list (list): String representations of the options, in source order.
+
+    Returns:
+    options (str): String representation of the merged options.
+    """
+    parsed = [parse_options(options) for options in options_list]
+    if len(parsed) > 1 and all('min' in options and 'max' in options for options in parsed):
+        minimos = [options['min'] for options in parsed if options['min'] == options['min']]
+        maximos = [options['max'] for options in parsed if options['max'] == options['max']]
+        return str({'min': min(minimos) if minimos else parsed[-1]['min'],
+                    'max': max(maximos) if maximos else parsed[-1]['max']})
+    return options_list[-1]
+
+
+def align_categoricals(frames, df_dict_new):
+    """
+    Gives the same pd.CategoricalDtype to a field in all the frames, so they can be stacked without falling
+    back to object columns. The categories are the keys of the field options followed by any other value
+    present in the frames. Fields that are not categorical in any frame are aligned only if all their values
+    are keys of their 'options' (the free text of a copy + new_options field is left as it is).
+
+    Args:
+    frames (list): Recoded dataframes, modified in place.
+    df_dict_new (pd.DataFrame): Data-Dictionary of the unified fields.
+    """
+    options_by_field = dict(zip(df_dict_new['campo_unificado'], df_dict_new['options']))
+    names = list(dict.fromkeys(name for frame in frames for name in frame.columns))
+    for name in names:
+        columns = [frame[name] for frame in frames if name in frame.columns]
+        categories = option_categories(parse_options(options_by_field.get(name, np.nan)))
+        is_categorical = any(isinstance(column.dtype, pd.CategoricalDtype) for column in columns)
+        if not categories and not is_categorical:
+            continue
+        observed = [column.cat.categories[column.cat.codes[column.cat.codes >= 0].unique()]
+                    if isinstance(column.dtype, pd.CategoricalDtype) else pd.unique(column.dropna())
+                    for column in columns]
+        if not is_categorical and not all(value in categories for values in observed for value in values):
+            continue
+        for values in observed:
+            categories += [value for value in values if value == value and value not in categories]
+        dtype = pd.CategoricalDtype(list(dict.fromkeys(categories)))
+        for frame in frames:
+            if name in frame.columns:
+                frame[name] = frame[name].astype(dtype)
+            else:
+                frame[name] = pd.Categorical.from_codes(np.full(len(frame), -1), dtype=dtype)
+
+
+def run_instructions_two_sources(df_instructions, df1_data, df2_data, categorical=False):
+    """
+    Applies every instruction row to both sources: code_2014 on df1_data and code_fmed_completo on df2_data.
+    The recoded columns of both sources get aligned categorical dtypes and are stacked into one long table with
+    a 'source' column ('2014' or 'fmed'), built with a single concat. Fields whose source column is missing in a
+    source are left empty (NaN) for that source.
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    df1_data (pd.DataFrame): Data dataframe 1 (2014).
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    categorical (bool): If True, recoded columns are built as pd.Categorical (see recode_categorical).
+
+    Returns:
+    df_unified (pd.DataFrame): Long table with the 'source' column and one column per unified field.
+    df_dict_new (pd.DataFrame): Data-Dictionary of the unified fields (the ranges of copy cover both sources).
+    """
+    plan = compile_instructions(df_instructions)
+    frames = []
+    registers = [[] for _ in plan]
+    for source, column_key in SOURCES.items():
+        df_data = df1_data if column_key == 'df1_column_name' else df2_data
+        positions = [n for n, field in enumerate(plan) if not SOURCE_ACTIONS & set(field['action_list'])
+                     or field[column_key] in df_data.columns]
+        source_plan = [dict(plan[n], df2_column_name=plan[n][column_key]) for n in positions]
+        df_data_new, df_dict_source = run_plan(source_plan, df_data, categorical)
+        frames.append(df_data_new)
+        for n, options in zip(positions, df_dict_source['options']):
+            registers[n].append(options)
+
+    df_dict_new = pd.DataFrame([{'category': field['category'], 'campo_unificado': field['new_column_name'],
+                                 'description': field['description_df1'] if 'recode_extend' in field['action_list']
+                                 else field['description_final'],
+                                 'options': merge_options(options) if options else str(field['value_options'])}
+                                for field, options in zip(plan, registers)], columns=create_dict().columns)
+
+    align_categoricals(frames, df_dict_new)
+    names = list(dict.fromkeys(field['new_column_name'] for field in plan))
+    df_unified = pd.concat([frame.reindex(columns=names) for frame in frames], keys=list(SOURCES),
+                           names=['source', None]).reset_index(level='source').reset_index(drop=True)
+    return df_unified, df_dict_new
+
+
+def scan_columns(data_fname, column_names, chunksize=100000, distinct=()):
+    """
+    First pass of the streaming mode: reads the selected columns in row chunks and collects, for every column,
+    the statistics needed to reproduce what a full pd.read_csv + copy() would decide.
+
+    Args:
+    data_fname (str): Path to the source CSV.
+    column_names (list): Columns to scan.
+    chunksize (int): Number of rows per chunk.
+    distinct (iterable): Columns whose distinct values are also collected (the recoded columns).
+
+    Returns:
+    stats (dict): For each column, its 'kind' as pd.read_csv would infer it over the whole file ('int', 'float'
+        or 'str'), the non-null, numeric and string counts used by copy() and the numeric 'min'/'max'. The
+        columns in distinct also have 'values', the set of their distinct non-null values as read, and
+        'has_null'.
+    """
+    stats = {name: new_scan_stats() for name in column_names}
+    for name in distinct:
+        stats[name]['values'], stats[name]['has_null'] = set(), False
+    for chunk in pd.read_csv(data_fname, usecols=column_names, dtype=str, chunksize=chunksize):
+        for name in column_names:
+            update_scan_stats(stats[name], chunk[name])
+            if 'values' in stats[name]:
+                stats[name]['values'].update(chunk[name].dropna().unique().tolist())
+                stats[name]['has_null'] |= bool(chunk[name].isna().any())
+
+    for column_stats in stats.values():
+        column_stats['kind'] = column_kind(column_stats)
+    return stats
+
+
+def new_scan_stats():
+    """Returns the empty statistics of a column for update_scan_stats."""
+    return {'non_null': 0, 'all_numeric': True, 'is_integer': True, 'float_count': 0, 'string_count': 0,
+            'null_count': 0, 'min': None, 'max': None}
+
+
+def update_scan_stats(column_stats, column):
+    """
+    Adds a chunk of a column to its scan statistics (see scan_columns).
+
+    Args:
+    column_stats (dict): Statistics of the column, updated in place.
+    column (pd.Series): Chunk of the column.
+
+    Returns:
+    profile (dict): profile_column of the chunk.
+    """
+    profile = profile_column(column)
+    parsed = profile['values']
+    non_null = column.notna().sum()
+    parsed_non_null = profile['numeric']
+    column_stats['non_null'] += non_null
+    column_stats['all_numeric'] &= bool(parsed_non_null == non_null)
+    column_stats['is_integer'] &= bool(parsed_non_null == len(parsed)) and is_integer_dtype(parsed)
+    column_stats['float_count'] += profile['numeric']
+    column_stats['string_count'] += profile['string']
+    column_stats['null_count'] += profile['null']
+    if parsed_non_null:
+        if column_stats['min'] is None or profile['min'] < column_stats['min']:
+            column_stats['min'] = profile['min']
+        if column_stats['max'] is None or profile['max'] > column_stats['max']:
+            column_stats['max'] = profile['max']
+    return profile
+
+
+def column_kind(column_stats):
+    """Returns the dtype pd.read_csv infers for the whole column ('int', 'float' or 'str') from its statistics."""
+    if column_stats['all_numeric'] and column_stats['is_integer'] and column_stats['non_null']:
+        return 'int'
+    if column_stats['all_numeric']:
+        return 'float'
+    return 'str'
+
+
+def cast_column(column, kind):
+    """
+    Casts a column read as strings to the dtype pd.read_csv infers for the whole file.
+
+    Args:
+    column (pd.Series): Column read with dtype=str.
+    kind (str): 'int', 'float' or 'str' as returned by scan_columns.
+
+    Returns:
+    column (pd.Series): Column with the whole-file dtype.
+    """
+    if kind == 'int':
+        return pd.to_numeric(column).astype('int64')
+    if kind == 'float':
+        return pd.to_numeric(column, errors='coerce').astype('float64')
+    return column
+
+
+def recode_dtype(column_stats, how_recode):
+    """
+    Returns the dtype that column.map(how_recode) has over the whole file, from the distinct values collected
+    by scan_columns (for example float64 when the mapped values are integers but some value is NaN or unmapped),
+    so every chunk of the streaming mode is written with the same dtype.
+
+    Args:
+    column_stats (dict): Statistics of the source column, with 'values'.
+    how_recode (dict): Mapping dictionary to be used for recoding.
+
+    Returns:
+    dtype: dtype of the recoded column.
+    """
+    values = sorted(column_stats['values']) + ([None] if column_stats['has_null'] else [])
+    sample = cast_column(pd.Series(values, dtype=str), column_stats['kind'])
+    return sample.map(how_recode).dtype
+
+
+def copy_options(column_stats, options_updated):
+    """
+    Reproduces the copy() decision and its options from the statistics of scan_columns.
+
+    Args:
+    column_stats (dict): Statistics of the source column.
+    options_updated (dict): Default options of the variable.
+
+    Returns:
+    is_numeric (bool): True when copy() would coerce the column to numbers.
+    options_updated (dict): Dictionary with the minimum and maximum values, or the default options.
+    """
+    if VERBOSE:
+        print(f'Numericos: {column_stats["float_count"]}')
+    if column_stats['float_count'] >= column_stats['string_count']:
+        if VERBOSE:
+            print('La columna es numerica y se podra encontrar un maximo y minimo')
+        dtype = np.int64 if column_stats['kind'] == 'int' else np.float64
+        minimo = dtype(np.nan if column_stats['min'] is None else column_stats['min'])
+        maximo = dtype(np.nan if column_stats['max'] is None else column_stats['max'])
+        return True, {'min': minimo, 'max': maximo}
+    if VERBOSE:
+        print(f'La columna es de strings y se quedan las opciones: {options_updated}')
+    return False, options_updated
+
+
+def count_values_with_nan(column, counts):
+    """
+    Adds the value counts of a column to an accumulated dictionary, keeping a single NaN key
+    (NaN != NaN, so the NaN of every chunk would otherwise be a different key).
+
+    Args:
+    column (pd.Series): Column chunk.
+    counts (dict): Accumulated counts, updated in place.
+    """
+    for value, count in column.value_counts().to_dict().items():
+        counts[value] = counts.get(value, 0) + count
+    nulls = int(column.isna().sum())
+    if nulls:
+        counts[np.nan] = counts.get(np.nan, 0) + nulls
+
+
+def run_instructions_chunked(df_instructions, data_fname, output_fname, chunksize=100000):
+    """
+    Streaming version of run_instructions for source files that do not fit in memory.
+    The source is read twice in chunks of rows: the first pass collects the column statistics that copy() needs
+    and the second one applies the actions to every chunk and appends the result to output_fname.
+    The recode validation counts and the min/max of copy are merged across chunks, so the Data-Dictionary is
+    the same as the one of an in-memory run.
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    data_fname (str): Path to the source CSV (fmed).
+    output_fname (str): Path of the recoded CSV to write.
+    chunksize (int): Number of rows per chunk.
+
+    Returns:
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded data.
+    """
+    header = pd.read_csv(data_fname, nrows=0).columns
+    plan = compile_instructions(df_instructions, header)
+    column_names = list(dict.fromkeys(field['df2_column_name'] for field in plan
+                                      if SOURCE_ACTIONS & set(field['action_list'])))
+    recoded = {field['df2_column_name'] for field in plan
+               if {'recode', 'recode_extend'} & set(field['action_list'])}
+    stats = scan_columns(data_fname, column_names, chunksize, distinct=recoded)
+
+    # Decidir una sola vez, con las estadisticas de todo el archivo, las opciones de cada campo
+    plans = []
+    for field in plan:
+        df2_column_name, description_final = field['df2_column_name'], field['description_final']
+        options_updated = field['value_options']
+        copy_numeric, dtype = None, None
+        for item in field['action_list']:
+            if item == 'add_to_dict':
+                options_updated = add_to_dict(field['actions'], field['value_options'])
+            elif item == 'recode':
+                dtype = recode_dtype(stats[df2_column_name], field['recode'])
+            elif item == 'recode_extend':
+                description_final = field['description_df1']
+                dtype = recode_dtype(stats[df2_column_name], field['recode'])
+            elif item == 'copy':
+                copy_numeric, options_updated = copy_options(stats[df2_column_name], options_updated)
+            elif item == 'new_options':
+                options_updated = new_options(field['actions'])
+            elif item == 'especial':
+                if VERBOSE:
+                    print(f"La variable {df2_column_name} requiere un trato especial")
+            elif item == 'none':
+                if VERBOSE:
+                    print(f"La accion solicitada {item} no se encuentra")
+        plans.append({'new_column_name': field['new_column_name'], 'df2_column_name': df2_column_name,
+                      'actions': field['actions'], 'copy_numeric': copy_numeric, 'dtype': dtype,
+                      'count_keys': {}, 'col2_counts': {},
+                      'register': {'category': field['category'], 'campo_unificado': field['new_column_name'],
+                                   'description': description_final, 'options': str(options_updated)}})
+
+    first = True
+    for chunk in pd.read_csv(data_fname, usecols=column_names, dtype=str, chunksize=chunksize):
+        for name in column_names:
+            chunk[name] = cast_column(chunk[name], stats[name]['kind'])
+        new_columns = {}
+        for plan in plans:
+            new_column_name, df2_column_name = plan['new_column_name'], plan['df2_column_name']
+            for item in plan['actions']['actions']:
+                if item in ('recode', 'recode_extend'):
+                    # tipo de todo el archivo: un chunk sin valores sin mapear no queda como int64
+                    new_columns[new_column_name] = chunk[df2_column_name].map(
+                        plan['actions']['recode']).astype(plan['dtype'])
+                    count_values_with_nan(chunk[df2_column_name], plan['count_keys'])
+                    count_values_with_nan(new_columns[new_column_name], plan['col2_counts'])
+                elif item == 'copy':
+                    if plan['copy_numeric']:
+                        # tipo de todo el archivo (float64 si hay NaN o 'na'), igual en todos los chunks
+                        kind = 'int' if stats[df2_column_name]['kind'] == 'int' else 'float'
+                        chunk[df2_column_name] = cast_column(chunk[df2_column_name], kind)
+                    new_columns[new_column_name] = chunk[df2_column_name]
+        pd.DataFrame(new_columns, index=chunk.index).to_csv(output_fname, mode='w' if first else 'a',
+                                                            header=first, index=False)
+        first = False
+
+    registers = []
+    for plan in plans:
+        if set(plan['actions']['actions']) & {'recode', 'recode_extend'}:
+            report = validate_counts(plan['actions']['recode'], plan['count_keys'], plan['col2_counts'])
+            if VERBOSE and report['valid']:
+                print('Recodificación EXITOSA')
+            elif VERBOSE:
+                print('PROBLEMAS en la recodificación')
+        registers.append(plan['register'])
+    return pd.DataFrame(registers, columns=create_dict().columns)
+
+
 def get_distribution2(df2_data, df2_data_new, df2_column_name, new_column_name):
     #Descomentar las siguientes tres lineas si queremos observar la distribucion de los valores.
     conteos_df_new = df2_data_new[new_column_name].value_counts()
@@ -358,15 +1323,27 @@ def get_distribution2(df2_data, df2_data_new, df2_column_name, new_column_name):
     return state
 
 def get_distribution(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode):
-    count_keys, count_values = count_relation(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
-    print(f'Relacion de recodificación: {how_recode}')
-    print(f'Conteo de llaves: {count_keys}')
-    print(f'Conteo de valores: {count_values}')
-    count_values_actualizado = check_dict_relation(how_recode, count_keys, count_values)
-    for valor in count_values_actualizado.values():
-        if valor != 0:
-            return False
-    return True
+    report = validate_recode(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode)
+    return report_distribution(how_recode, report)
+
+def report_distribution(how_recode, report):
+    """
+    Muestra los conteos de un reporte de validate_recode (o de recode_group) y regresa su resultado.
+
+    Args:
+        how_recode (dict): Diccionario que relaciona las llaves con los valores recodificados.
+        report (dict): Reporte de la validación.
+
+    Returns:
+        bool: True si la relación how_recode se cumple.
+    """
+    if VERBOSE:
+        print(f'Relacion de recodificación: {how_recode}')
+        print(f'Conteo de llaves: {report["count_keys"]}')
+        print(f'Conteo de valores: {report["count_values"]}')
+    if _RECORDER is not None:
+        _RECORDER.validation(report)
+    return report['valid']
 
 def count_relation(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode):
     """
@@ -384,26 +1361,101 @@ def count_relation(df2_data, df2_data_new, df2_column_name, new_column_name, how
         tuple: Retorna una tupla con dos diccionarios. El primer diccionario contiene la cuenta de las llaves en df2_column_name
         y el segundo diccionario contiene la cuenta de los valores de cada llave en new_column_name según how_recode.
     """
-    col1 = df2_data[df2_column_name].tolist()
-    col2 = df2_data_new[new_column_name].tolist()
-    count_keys = {}
-    count_values = {}
+    # Un solo conteo por columna con value_counts: O(filas) en lugar de O(filas x llaves)
+    count_keys = observed_counts(df2_data[df2_column_name])
+    col2_counts = observed_counts(df2_data_new[new_column_name])
+    count_values = relation_from_counts(how_recode, count_keys, col2_counts)
+    return count_keys, count_values
+
+
+def observed_counts(column):
+    """
+    Cuenta los valores de una columna (incluyendo NaN) con value_counts, omitiendo las categorias
+    sin apariciones de las columnas categoricas.
+
+    Args:
+        column (pandas.Series): Columna a contar.
+
+    Returns:
+        dict: Conteo de cada valor presente en la columna.
+    """
+    counts = column.value_counts(dropna=False)
+    return counts[counts > 0].to_dict()
 
-    # Obtener las llaves únicas presentes en col1
-    unique_keys = set(col1)
 
-    for key in unique_keys:
-        # Contar el número de apariciones de la llave en col1
-        count_keys[key] = col1.count(key)
+def relation_from_counts(how_recode, count_keys, col2_counts):
+    """
+    Obtiene count_values a partir de los conteos ya calculados de ambas columnas.
+
+    Args:
+        how_recode (dict): Diccionario que relaciona las llaves con los valores recodificados.
+        count_keys (dict): Conteo de cada valor de la columna original.
+        col2_counts (dict): Conteo de cada valor de la columna recodificada.
+
+    Returns:
+        dict: Conteo en la columna recodificada de los valores de how_recode cuyas llaves aparecen en count_keys.
+    """
+    count_values = {}
+    for key in count_keys:
         if key in how_recode:
             # Obtener el valor asociado con la llave
             value = how_recode[key]
-            # Contar el número de apariciones del valor en col2
-            count_values[value] = col2.count(value)
+            # Número de apariciones del valor en col2
+            count_values[value] = col2_counts.get(value, 0)
         #else:
-        #    print(f'Error con la llave {key} en {df2_column_name}')
+        #    print(f'Error con la llave {key}')
+    return count_values
+
+
+def validate_recode(df2_data, df2_data_new, df2_column_name, new_column_name, how_recode):
+    """
+    Valida una recodificación contando llaves y valores en una sola pasada vectorizada y reporta
+    las llaves sin mapeo y las colisiones (varias llaves que se recodifican al mismo valor).
+
+    Args:
+        df2_data (pandas.DataFrame): The DataFrame that contains the original column.
+        df2_data_new (pandas.DataFrame): The DataFrame that contains the recoded column.
+        df2_column_name (str): The name of the original column.
+        new_column_name (str): The name of the recoded column.
+        how_recode (dict): Diccionario que relaciona las llaves de df2_column_name con los valores de new_column_name.
+
+    Returns:
+        dict: Reporte con las llaves 'count_keys', 'count_values' (los mismos conteos que count_relation),
+        'valid' (el mismo resultado que get_distribution), 'unmapped_keys' (conteo de las llaves no nulas
+        sin mapeo en how_recode) y 'collisions' (valor -> llaves presentes que se recodifican a ese valor).
+    """
+    count_keys = observed_counts(df2_data[df2_column_name])
+    col2_counts = observed_counts(df2_data_new[new_column_name])
+    return validate_counts(how_recode, count_keys, col2_counts)
+
+
+def validate_counts(how_recode, count_keys, col2_counts):
+    """
+    Construye el reporte de validate_recode a partir de los conteos de ambas columnas, de modo que los conteos
+    puedan calcularse por partes (por ejemplo por bloques de filas) y sumarse antes de validar.
+
+    Args:
+        how_recode (dict): Diccionario que relaciona las llaves con los valores recodificados.
+        count_keys (dict): Conteo de cada valor de la columna original.
+        col2_counts (dict): Conteo de cada valor de la columna recodificada.
+
+    Returns:
+        dict: El mismo reporte que validate_recode.
+    """
+    count_values = relation_from_counts(how_recode, count_keys, col2_counts)
+    count_values_actualizado = check_dict_relation(how_recode, count_keys, count_values.copy())
+    valid = all(valor == 0 for valor in count_values_actualizado.values())
+
+    unmapped_keys = {key: count for key, count in count_keys.items() if key == key and key not in how_recode}
+    keys_by_value = {}
+    for key in count_keys:
+        if key in how_recode:
+            keys_by_value.setdefault(how_recode[key], []).append(key)
+    collisions = {value: keys for value, keys in keys_by_value.items() if len(keys) > 1}
+
+    return {'count_keys': count_keys, 'count_values': count_values, 'valid': valid,
+            'unmapped_keys': unmapped_keys, 'collisions': collisions}
 
-    return count_keys, count_values
 
 def check_dict_relation(how_recode, count_keys, count_values):
     """
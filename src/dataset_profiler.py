@@ -0,0 +1,205 @@
+import argparse
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import data_processor
+
+MAX_OPTIONS = 30  # columnas con a lo mas este numero de valores distintos reciben sus opciones exactas
+SKETCH_PRECISION = 12  # 2**12 registros: error relativo de ~1.6% en los conteos aproximados
+
+
+class DistinctSketch:
+    """
+    HyperLogLog sketch of the distinct values of a column: a fixed array of 2**precision registers, whatever
+    the number of rows or distinct values. Sketches of different chunks can be merged.
+    """
+
+    def __init__(self, precision=SKETCH_PRECISION):
+        self.precision = precision
+        self.registers = np.zeros(2 ** precision, dtype=np.uint8)
+
+    def add(self, column):
+        """Adds the values of a column (without NaN) to the sketch."""
+        if not len(column):
+            return
+        hashes = pd.util.hash_pandas_object(column, index=False).to_numpy()
+        buckets = (hashes >> np.uint64(64 - self.precision)).astype(np.intp)
+        rest = hashes & np.uint64(2 ** (64 - self.precision) - 1)
+        # posicion del primer bit en 1 de los bits restantes (exacta: caben en la mantisa de un float64)
+        ranks = (64 - self.precision + 1 - np.frexp(rest.astype(np.float64))[1]).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+
+    def merge(self, other):
+        """Adds the values of another sketch with the same precision."""
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        """Returns the estimated number of distinct values."""
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.ldexp(1.0, -self.registers.astype(np.int64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # rango bajo: conteo lineal
+        return int(round(estimate))
+
+
+def new_column_stats(precision=SKETCH_PRECISION):
+    """Returns the empty statistics of a column for update_column_stats."""
+    column_stats = data_processor.new_scan_stats()
+    column_stats['counts'] = {}
+    column_stats['sketch'] = DistinctSketch(precision)
+    return column_stats
+
+
+def update_column_stats(column_stats, column, max_options=MAX_OPTIONS):
+    """
+    Adds a chunk of a column to its statistics: the counts of data_processor.update_scan_stats, the exact value
+    counts while the column has at most max_options distinct values, and the sketch of its distinct values.
+
+    Args:
+    column_stats (dict): Statistics of the column, updated in place.
+    column (pd.Series): Chunk of the column.
+    max_options (int): Maximum number of distinct values whose counts are kept.
+    """
+    data_processor.update_scan_stats(column_stats, column)
+    #OMITIR 'na' CUANDO tenga significado diferente a null/NaN
+    values = column[column.notna() & (column != 'na')] if not pd.api.types.is_numeric_dtype(column) \
+        else column.dropna()
+    column_stats['sketch'].add(values)
+    if column_stats['counts'] is not None:
+        counts = values.value_counts(sort=False)
+        for value, count in zip(counts.index.tolist(), counts.tolist()):
+            column_stats['counts'][value] = column_stats['counts'].get(value, 0) + count
+        if len(column_stats['counts']) > max_options:
+            column_stats['counts'] = None  # columna de alta cardinalidad: solo queda el sketch
+
+
+def profile_chunks(chunks, max_options=MAX_OPTIONS, jobs=None, precision=SKETCH_PRECISION):
+    """
+    Profiles every column of a dataset in a single pass over its row chunks. The columns of each chunk are
+    processed by a thread pool.
+
+    Args:
+    chunks (iterable): DataFrames with the same columns (for example, pd.read_csv with chunksize).
+    max_options (int): Maximum number of distinct values whose counts are kept.
+    jobs (int): Number of threads. Defaults to the number of CPUs.
+    precision (int): Precision of the distinct value sketches.
+
+    Returns:
+    stats (dict): Statistics of every column, in the order of the columns.
+    """
+    stats = {}
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as executor:
+        for chunk in chunks:
+            for name in chunk.columns:
+                if name not in stats:
+                    stats[name] = new_column_stats(precision)
+            list(executor.map(lambda name: update_column_stats(stats[name], chunk[name], max_options),
+                              chunk.columns))
+    for column_stats in stats.values():
+        column_stats['kind'] = data_processor.column_kind(column_stats)
+    return stats
+
+
+def option_key(value):
+    """Converts an exact value read as text to the number it represents (int when it is integral)."""
+    number = pd.to_numeric(pd.Series([value], dtype=object), errors='coerce').iloc[0]
+    if number != number:
+        return value
+    return int(number) if float(number).is_integer() else float(number)
+
+
+def options_from_stats(column_stats):
+    """
+    Builds the options of a column from its statistics: 'type' (as pd.read_csv would infer it), 'null' (NaN
+    and 'na'), 'distinct' (exact, or estimated by the sketch when 'approximate' is True), 'min'/'max' when
+    copy() would treat the column as numeric, and for low-cardinality columns the exact 'options' (value ->
+    label, the value itself since there are no labels) with their 'counts' and 'is_category'.
+
+    Args:
+    column_stats (dict): Statistics returned by profile_chunks.
+
+    Returns:
+    options (dict): Options of the column.
+    """
+    options = {'type': column_stats['kind'], 'null': int(column_stats['null_count'])}
+    counts = column_stats['counts']
+    if column_stats['float_count'] >= column_stats['string_count'] and column_stats['min'] is not None:
+        dtype = np.int64 if column_stats['kind'] == 'int' else np.float64
+        # escalares de Python: el diccionario se escribe con str() y se vuelve a leer como literal
+        options['min'], options['max'] = dtype(column_stats['min']).item(), dtype(column_stats['max']).item()
+        if counts is not None:
+            numeric_counts = {}
+            for value, count in counts.items():
+                key = option_key(value) if isinstance(value, str) else value
+                numeric_counts[key] = numeric_counts.get(key, 0) + count
+            counts = numeric_counts
+    if counts is not None:
+        options['distinct'], options['approximate'] = len(counts), False
+        try:
+            counts = dict(sorted(counts.items()))
+        except TypeError:
+            pass  # valores de tipos mezclados: quedan en orden de aparicion
+        options['options'] = {value: str(value) for value in counts}
+        options['counts'] = counts
+        options['is_category'] = 'true'
+    else:
+        options['distinct'], options['approximate'] = column_stats['sketch'].estimate(), True
+    return options
+
+
+def profile_dataset(data, chunksize=None, max_options=MAX_OPTIONS, jobs=None, category=None, df_dict=None):
+    """
+    Builds the Data-Dictionary of a whole dataset (for example, a source file that was not recoded) in one
+    pass over its rows, with the structure of data_processor.create_dict.
+
+    Args:
+    data (str or pd.DataFrame): Path of a CSV, read as text like scan_columns, or a dataframe.
+    chunksize (int): Rows per chunk to stream the CSV. By default it is read at once.
+    max_options (int): Columns with at most this many distinct values get their exact options.
+    jobs (int): Number of threads. Defaults to the number of CPUs.
+    category (str): Category of the columns that are not in df_dict.
+    df_dict (pd.DataFrame): Existing Data-Dictionary to take the category and description of the columns from.
+
+    Returns:
+    df_dict_new (pd.DataFrame): Data-Dictionary dataframe, with the options as strings like run_plan.
+    """
+    if isinstance(data, pd.DataFrame):
+        chunks = [data] if chunksize is None else (data.iloc[start:start + chunksize]
+                                                   for start in range(0, len(data), chunksize))
+    elif chunksize is None:
+        chunks = [data_processor.read_csv_fast(data, dtype=str)]
+    else:
+        chunks = pd.read_csv(data, dtype=str, chunksize=chunksize)
+    stats = profile_chunks(chunks, max_options, jobs)
+
+    known = {}
+    if df_dict is not None:
+        known = {code: (categoria, description) for categoria, code, description in
+                 df_dict[['category', 'campo_unificado', 'description']].itertuples(index=False, name=None)}
+    registers = []
+    for name, column_stats in stats.items():
+        categoria, description = known.get(name, (category, np.nan))
+        registers.append({'category': categoria, 'campo_unificado': name, 'description': description,
+                          'options': str(options_from_stats(column_stats))})
+    return pd.DataFrame(registers, columns=data_processor.create_dict().columns)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Construye el diccionario de datos de un CSV en una sola pasada.')
+    parser.add_argument('data', help='CSV de datos.')
+    parser.add_argument('output', help='CSV del diccionario a escribir.')
+    parser.add_argument('--chunksize', type=int, default=None)
+    parser.add_argument('--max-options', type=int, default=MAX_OPTIONS)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--category', default=None)
+    parser.add_argument('--dict', help='Diccionario existente para tomar categorias y descripciones.')
+    args = parser.parse_args()
+
+    df_dict = pd.read_csv(args.dict) if args.dict else None
+    profile_dataset(args.data, args.chunksize, args.max_options, args.jobs, args.category,
+                    df_dict).to_csv(args.output, index=False)
@@ -0,0 +1,117 @@
+import hashlib
+import os
+import pickle
+
+import pandas as pd
+
+import data_processor
+
+FIELD_KEYS = ['new_column_name', 'description_df1', 'description_df2', 'description_final', 'value_options',
+              'actions', 'df1_column_name', 'df2_column_name', 'category']
+
+
+def field_fingerprint(field, df2_data, categorical=False):
+    """
+    Fingerprint of an instruction row together with the content of its source column.
+
+    Args:
+    field (dict): Field of the plan returned by data_processor.compile_instructions.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    categorical (bool): Whether recoded columns are built as pd.Categorical.
+
+    Returns:
+    fingerprint (str): SHA-256 hex digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(repr([field[key] for key in FIELD_KEYS]).encode())
+    digest.update(repr((data_processor.PLAN_VERSION, categorical)).encode())
+    if data_processor.SOURCE_ACTIONS & set(field['action_list']):
+        column = df2_data[field['df2_column_name']]
+        digest.update(str(column.dtype).encode())
+        digest.update(pd.util.hash_pandas_object(column, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def run_plan_incremental(plan, df2_data, cache_dir=data_processor.PATH + data_processor.FIELD_CACHE_DIRNAME,
+                         categorical=False, prune=True):
+    """
+    Incremental version of data_processor.run_plan: the result of every field (its new columns, its
+    Data-Dictionary register and, for copy, the coerced source column) is stored in cache_dir under its
+    fingerprint, and only the fields whose instruction row or source column changed are recomputed.
+
+    Args:
+    plan (list): Plan returned by data_processor.compile_instructions or data_processor.load_plan.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    cache_dir (str): Directory of the per-field cache. Use one directory per source dataset.
+    categorical (bool): If True, recoded columns are built as pd.Categorical.
+    prune (bool): If True, cached fields not used by this run are deleted.
+
+    Returns:
+    df2_data_new (pd.DataFrame): Recoded dataframe.
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded dataframe.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    new_columns = {}
+    registers = []
+    used = set()
+    recomputed = 0
+    for field in plan:
+        # la huella se calcula con df2_data tal como lo dejaron los campos anteriores (copy lo modifica)
+        fingerprint = field_fingerprint(field, df2_data, categorical)
+        field_fname = os.path.join(cache_dir, fingerprint + '.pkl')
+        used.add(fingerprint + '.pkl')
+        if os.path.exists(field_fname):
+            with open(field_fname, 'rb') as f:
+                field_columns, register, coerced = pickle.load(f)
+        else:
+            recomputed += 1
+            field_columns = {}
+            code, description, options, categoria = data_processor.apply_actions(
+                df2_data, field_columns, field['new_column_name'], field['description_df1'],
+                field['description_df2'], field['description_final'], field['value_options'],
+                field['value_options'], field['actions'], field['df1_column_name'], field['df2_column_name'],
+                field['category'], categorical)
+            register = {'category': categoria, 'campo_unificado': code, 'description': description,
+                        'options': options}
+            coerced = df2_data[field['df2_column_name']] if 'copy' in field['action_list'] else None
+            tmp_fname = field_fname + '.tmp'
+            with open(tmp_fname, 'wb') as f:
+                pickle.dump((field_columns, register, coerced), f)
+            os.replace(tmp_fname, field_fname)
+        if coerced is not None:
+            df2_data[field['df2_column_name']] = coerced  # igual que copy() en la ejecucion completa
+        new_columns.update(field_columns)
+        registers.append(register)
+
+    if prune:
+        for fname in os.listdir(cache_dir):
+            if fname.endswith('.pkl') and fname not in used:
+                os.remove(os.path.join(cache_dir, fname))
+    if data_processor.VERBOSE:
+        print(f'Campos recalculados: {recomputed} de {len(plan)}')
+
+    df2_data_new = pd.DataFrame(new_columns, index=df2_data.index)
+    df2_dict_new = pd.DataFrame(registers, columns=data_processor.create_dict().columns)
+    return df2_data_new, df2_dict_new
+
+
+def run_instructions_incremental(df_instructions, df2_data,
+                                 cache_dir=data_processor.PATH + data_processor.FIELD_CACHE_DIRNAME,
+                                 categorical=False, prune=True):
+    """
+    Compiles the instructions dataframe and applies it to df2_data recomputing only the changed fields
+    (see run_plan_incremental).
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    cache_dir (str): Directory of the per-field cache.
+    categorical (bool): If True, recoded columns are built as pd.Categorical.
+    prune (bool): If True, cached fields not used by this run are deleted.
+
+    Returns:
+    df2_data_new (pd.DataFrame): Recoded dataframe.
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded dataframe.
+    """
+    plan = data_processor.compile_instructions(df_instructions, df2_data.columns)
+    return run_plan_incremental(plan, df2_data, cache_dir, categorical, prune)
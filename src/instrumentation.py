@@ -0,0 +1,118 @@
+import contextlib
+import json
+import logging
+import time
+import tracemalloc
+
+import pandas as pd
+
+import data_processor
+
+logger = logging.getLogger('recoder')
+
+
+class Recorder:
+    """
+    Collects one record per executed action: field, source column, action, rows processed, wall time,
+    incremental and peak traced memory (tracemalloc) and, for recodes, the validation outcome.
+    Every record is also emitted as a JSON log line on the 'recoder' logger.
+    """
+
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.records = []
+        self.peak_memory = None
+        self._current = None
+        self._start = None
+        self._memory_start = 0
+
+    def start_action(self, field, column, action, rows):
+        self._current = {'field': field, 'column': column, 'action': action, 'rows': rows, 'seconds': None,
+                         'memory_incremental': None, 'memory_peak': None, 'valid': None, 'unmapped_keys': None}
+        if self.track_memory and tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+            self._memory_start = tracemalloc.get_traced_memory()[0]
+        self._start = time.perf_counter()
+
+    def validation(self, report):
+        if self._current is not None:
+            self._current['valid'] = report['valid']
+            self._current['unmapped_keys'] = len(report['unmapped_keys'])
+
+    def memory(self, peak):
+        """Stores the peak memory of the process reported by a low-memory run (data_processor.peak_memory)."""
+        self.peak_memory = peak
+        logger.info(json.dumps({'peak_memory': peak}))
+
+    def end_action(self):
+        record = self._current
+        record['seconds'] = time.perf_counter() - self._start
+        if self.track_memory and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            record['memory_incremental'] = current - self._memory_start
+            record['memory_peak'] = peak - self._memory_start
+        self.records.append(record)
+        self._current = None
+        logger.info(json.dumps(record, default=str))
+
+    def to_frame(self):
+        """Returns the records as a DataFrame, one row per action."""
+        return pd.DataFrame(self.records, columns=['field', 'column', 'action', 'rows', 'seconds',
+                                                   'memory_incremental', 'memory_peak', 'valid', 'unmapped_keys'])
+
+    def field_summary(self):
+        """Returns the totals per field, sorted by wall time (the fields that eat the runtime first)."""
+        actions = self.to_frame()
+        summary = actions.groupby('field', sort=False).agg(
+            column=('column', 'first'), actions=('action', ','.join), rows=('rows', 'max'),
+            seconds=('seconds', 'sum'), memory_incremental=('memory_incremental', 'sum'),
+            memory_peak=('memory_peak', 'max'), valid=('valid', lambda valid: None if valid.isna().all()
+                                                       else bool(valid.dropna().all())))
+        return summary.sort_values('seconds', ascending=False).reset_index()
+
+    def write(self, fname):
+        """
+        Writes the run report: a .json file with the per-action records and the per-field summary, or a .csv
+        file with the per-action records.
+        """
+        if fname.endswith('.csv'):
+            self.to_frame().to_csv(fname, index=False)
+        else:
+            summary = self.field_summary().astype(object).where(lambda frame: frame.notna(), None)
+            with open(fname, 'w') as f:
+                json.dump({'actions': self.records, 'fields': summary.to_dict('records'),
+                           'peak_memory': self.peak_memory}, f, indent=2, default=str)
+
+
+@contextlib.contextmanager
+def instrument(quiet=True, track_memory=True):
+    """
+    Records every action executed by data_processor.apply_actions inside the block.
+    Only runs in the current process are recorded (not the workers of parallel_processor).
+
+    Args:
+    quiet (bool): If True, the messages of the actions are not built nor printed.
+    track_memory (bool): If True, memory is traced with tracemalloc (slower).
+
+    Yields:
+    recorder (Recorder): The records of the run.
+
+    Example:
+    with instrument() as recorder:
+        data_processor.run_instructions(df_instructions, df2_data)
+    recorder.write('reporte.json')
+    """
+    recorder = Recorder(track_memory)
+    previous = data_processor._RECORDER, data_processor.VERBOSE
+    started = track_memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    data_processor._RECORDER = recorder
+    if quiet:
+        data_processor.VERBOSE = False
+    try:
+        yield recorder
+    finally:
+        data_processor._RECORDER, data_processor.VERBOSE = previous
+        if started:
+            tracemalloc.stop()
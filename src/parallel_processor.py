@@ -0,0 +1,142 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import data_processor
+
+_DF2_DATA = None  # df2_data heredado por los procesos hijos cuando se usa fork (copy-on-write, sin pickle)
+
+
+def shard_plan(plan, jobs):
+    """
+    Splits the plan into at most `jobs` shards of instruction rows.
+    Rows that read the same source column go to the same shard and keep their order, because copy() writes the
+    coerced column back into df2_data and a later row may read it.
+
+    Args:
+    plan (list): Plan returned by data_processor.compile_instructions.
+    jobs (int): Number of shards.
+
+    Returns:
+    shards (list): Lists of plan positions, each one sorted.
+    """
+    groups = {}
+    for n, field in enumerate(plan):
+        if data_processor.SOURCE_ACTIONS & set(field['action_list']):
+            groups.setdefault(('column', field['df2_column_name']), []).append(n)
+        else:
+            groups[('row', n)] = [n]
+
+    shards = [[] for _ in range(max(1, jobs))]
+    # Los grupos mas grandes primero, cada uno al shard con menos filas
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return [sorted(shard) for shard in shards if shard]
+
+
+def _run_shard(fields, df2_data=None, categorical=False):
+    """
+    Applies the actions of a shard of the plan.
+
+    Args:
+    fields (list): (position, field) pairs of the plan.
+    df2_data (pd.DataFrame): Source columns of the shard. If None, the frame inherited from the parent is used.
+    categorical (bool): If True, recoded columns are built as pd.Categorical.
+
+    Returns:
+    results (list): (position, new columns, register) for every field.
+    coerced (dict): Source columns that copy() rewrote in df2_data.
+    """
+    if df2_data is None:
+        df2_data = _DF2_DATA
+    results = []
+    coerced = {}
+    for n, field in fields:
+        new_columns = {}
+        code, description, options, categoria = data_processor.apply_actions(
+            df2_data, new_columns, field['new_column_name'], field['description_df1'], field['description_df2'],
+            field['description_final'], field['value_options'], field['value_options'], field['actions'],
+            field['df1_column_name'], field['df2_column_name'], field['category'], categorical)
+        if 'copy' in field['action_list']:
+            coerced[field['df2_column_name']] = df2_data[field['df2_column_name']]
+        results.append((n, new_columns, {'category': categoria, 'campo_unificado': code,
+                                         'description': description, 'options': options}))
+    return results, coerced
+
+
+def run_plan_parallel(plan, df2_data, jobs=None, categorical=False):
+    """
+    Parallel version of data_processor.run_plan: the instruction rows are sharded across worker processes and
+    the output columns and Data-Dictionary registers are merged back in instruction order.
+    With the fork start method the workers inherit df2_data without pickling it; otherwise each worker only
+    receives the source columns of its shard.
+
+    Args:
+    plan (list): Plan returned by data_processor.compile_instructions or data_processor.load_plan.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    jobs (int): Number of worker processes. Defaults to the number of CPUs.
+    categorical (bool): If True, recoded columns are built as pd.Categorical.
+
+    Returns:
+    df2_data_new (pd.DataFrame): Recoded dataframe.
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded dataframe.
+    """
+    global _DF2_DATA
+    jobs = jobs or os.cpu_count() or 1
+    shards = shard_plan(plan, jobs)
+    if jobs == 1 or len(shards) <= 1:
+        return data_processor.run_plan(plan, df2_data, categorical)
+
+    use_fork = 'fork' in multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if use_fork else None)
+    _DF2_DATA = df2_data
+    try:
+        with ProcessPoolExecutor(max_workers=len(shards), mp_context=context) as executor:
+            futures = []
+            for shard in shards:
+                fields = [(n, plan[n]) for n in shard]
+                if use_fork:
+                    futures.append(executor.submit(_run_shard, fields, None, categorical))
+                else:
+                    columns = list(dict.fromkeys(field['df2_column_name'] for _, field in fields
+                                                 if field['df2_column_name'] in df2_data.columns))
+                    futures.append(executor.submit(_run_shard, fields, df2_data[columns], categorical))
+            outputs = [future.result() for future in futures]
+    finally:
+        _DF2_DATA = None
+
+    field_columns = [None] * len(plan)
+    registers = [None] * len(plan)
+    for results, coerced in outputs:
+        for n, new_columns, register in results:
+            field_columns[n] = new_columns
+            registers[n] = register
+        for column_name, column in coerced.items():
+            df2_data[column_name] = column  # igual que copy() en la ejecucion secuencial
+
+    new_columns = {}
+    for columns in field_columns:
+        new_columns.update(columns)
+    df2_data_new = pd.DataFrame(new_columns, index=df2_data.index)
+    df2_dict_new = pd.DataFrame(registers, columns=data_processor.create_dict().columns)
+    return df2_data_new, df2_dict_new
+
+
+def run_instructions_parallel(df_instructions, df2_data, jobs=None, categorical=False):
+    """
+    Compiles the instructions dataframe and applies it to df2_data with `jobs` worker processes.
+
+    Args:
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    df2_data (pd.DataFrame): Data dataframe 2 (fmed).
+    jobs (int): Number of worker processes. Defaults to the number of CPUs.
+    categorical (bool): If True, recoded columns are built as pd.Categorical.
+
+    Returns:
+    df2_data_new (pd.DataFrame): Recoded dataframe.
+    df2_dict_new (pd.DataFrame): Data-Dictionary dataframe of the recoded dataframe.
+    """
+    plan = data_processor.compile_instructions(df_instructions, df2_data.columns)
+    return run_plan_parallel(plan, df2_data, jobs=jobs, categorical=categorical)
@@ -0,0 +1,127 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import data_processor
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:  # sin pyarrow las copias se guardan con pickle
+    pa = None
+
+
+def file_hash(fname, block_size=1 << 20):
+    """Returns the BLAKE2b hex digest of the content of a file, read in blocks."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def snapshot_key(fname, read_kwargs, known=None):
+    """
+    Returns the key of the snapshot of a CSV: its size, mtime and content hash plus the read options.
+    The content is only hashed again when size or mtime differ from the known entry.
+
+    Args:
+    fname (str): Path to the CSV.
+    read_kwargs (dict): Arguments for pd.read_csv.
+    known (dict): Entry stored for the previous snapshot, if any.
+
+    Returns:
+    entry (dict): 'size', 'mtime_ns', 'hash' and 'kwargs' of the file.
+    """
+    stat = os.stat(fname)
+    entry = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'kwargs': repr(sorted(read_kwargs.items()))}
+    if known and all(known.get(key) == entry[key] for key in ('size', 'mtime_ns', 'kwargs')):
+        entry['hash'] = known['hash']
+    else:
+        entry['hash'] = file_hash(fname)
+    return entry
+
+
+def read_csv_cached(fname, cache_dir=data_processor.PATH + data_processor.SNAPSHOT_CACHE_DIRNAME, **read_kwargs):
+    """
+    Reads a CSV through a binary snapshot: the first time the CSV is parsed and saved as an uncompressed
+    Feather (Arrow IPC) file; later calls load the snapshot instead of parsing the CSV while the size, mtime
+    and content hash of the CSV (and the read options) are the same. Dataframes that Arrow cannot store (for
+    example, object columns with mixed types) are saved with pickle.
+
+    Args:
+    fname (str): Path to the CSV.
+    cache_dir (str): Directory of the snapshots.
+    **read_kwargs: Arguments for pd.read_csv.
+
+    Returns:
+    df (pd.DataFrame): Dataframe read.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    # cada combinacion de archivo (ruta absoluta) y opciones de lectura tiene su propia copia
+    path_digest = hashlib.blake2b(os.path.abspath(fname).encode(), digest_size=8).hexdigest()
+    kwargs_digest = hashlib.blake2b(repr(sorted(read_kwargs.items())).encode(), digest_size=8).hexdigest()
+    prefix = f'{os.path.basename(fname)}_{path_digest}_{kwargs_digest}'
+    entry_fname = os.path.join(cache_dir, prefix + '.json')
+    known = None
+    if os.path.exists(entry_fname):
+        with open(entry_fname) as f:
+            known = json.load(f)
+    entry = snapshot_key(fname, read_kwargs, known)
+    feather_fname = os.path.join(cache_dir, f'{prefix}_{entry["hash"]}.feather')
+    pickle_fname = os.path.join(cache_dir, f'{prefix}_{entry["hash"]}.pkl')
+
+    if pa is not None and os.path.exists(feather_fname):
+        snapshot_fname = feather_fname
+        df = feather.read_table(snapshot_fname, memory_map=True).to_pandas()
+    elif os.path.exists(pickle_fname):
+        snapshot_fname = pickle_fname
+        df = pd.read_pickle(snapshot_fname)
+    else:
+        df = pd.read_csv(fname, **read_kwargs)
+        snapshot_fname = pickle_fname
+        if pa is not None:
+            try:
+                feather.write_feather(df, feather_fname + '.tmp', compression='uncompressed')
+                snapshot_fname = feather_fname
+            except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+                # columnas con tipos mezclados (pd.read_csv con DtypeWarning): Arrow no las puede guardar
+                if os.path.exists(feather_fname + '.tmp'):
+                    os.remove(feather_fname + '.tmp')
+        if snapshot_fname == pickle_fname:
+            df.to_pickle(pickle_fname + '.tmp')
+        os.replace(snapshot_fname + '.tmp', snapshot_fname)
+        for old in os.listdir(cache_dir):
+            if old.startswith(prefix + '_') and os.path.join(cache_dir, old) != snapshot_fname:
+                os.remove(os.path.join(cache_dir, old))
+
+    if entry != known:
+        with open(entry_fname, 'w') as f:
+            json.dump(entry, f)
+    return df
+
+
+def read_data_cached(cache_dir=data_processor.PATH + data_processor.SNAPSHOT_CACHE_DIRNAME):
+    """
+    Same as data_processor.read_data, but the four files are read concurrently through their snapshots
+    (see read_csv_cached).
+
+    Args:
+    cache_dir (str): Directory of the snapshots.
+
+    Returns:
+    df1_dict (pd.DataFrame): Data-Dictionary dataframe 1.
+    df1_data (pd.DataFrame): Data dataframe 1.
+    df_instructions (pd.DataFrame): Instructions dataframe.
+    df2_data (pd.DataFrame): Data dataframe 2.
+    """
+    fnames = [data_processor.PATH + fname for fname in (data_processor.DF1_DICT_FNAME, data_processor.DF1_DATA_FNAME,
+                                                         data_processor.INSTRUCTIONS_FNAME,
+                                                         data_processor.DF2_DATA_FNAME)]
+    with ThreadPoolExecutor(max_workers=len(fnames)) as executor:
+        df1_dict, df1_data, df_instructions, df2_data = executor.map(
+            lambda fname: read_csv_cached(fname, cache_dir), fnames)
+    return df1_dict, df1_data, df_instructions, df2_data
@@ -0,0 +1,48 @@
+import unittest
+import numpy as np
+import pandas as pd
+import data_processor
+import arrow_backend
+
+
+@unittest.skipIf(arrow_backend.pa is None, 'requiere pyarrow')
+class TestArrow_Backend(unittest.TestCase):
+    def test_run_instructions_arrow(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'tema', 'mixto', 'peso'],
+            'description_2014': ['Sexo', 'Edad', 'Tema', 'Mixto', 'Peso'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Tema fmed', 'Mixto fmed', 'Peso fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, None, "{'options': {1: 'si'}}", None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}", "{'actions': ['copy']}",
+                         "{'actions': ['copy', 'new_options'], 'new_options': {1: 'si'}}",
+                         "{'actions': ['recode_extend'], 'recode': {'s': 1, 'n': 'no'}}", "{'actions': ['copy']}"],
+            'code_2014': ['s14', 'e14', 't14', 'm14', 'p14'],
+            'code_fmed_completo': ['s', 'e', 't', 'm', 'p'],
+            'subcategoria': ['demo', 'demo', 'otros', 'otros', 'demo'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'x', None], 'e': ['20', '35', 'na', '40'],
+                                 't': ['a', 'b', 'a', 'c'], 'm': pd.Series(['s', None, 'z', 's'], dtype=object),
+                                 'p': [60.5, np.nan, 70.0, 80.0]})
+        expected = data_processor.run_instructions(df_instructions, df2_data.copy())
+        result = data_processor.run_instructions(df_instructions, df2_data.copy(), backend='arrow')
+        pd.testing.assert_frame_equal(result[0], expected[0])
+        pd.testing.assert_frame_equal(result[1], expected[1])
+
+        recoded, profiles = arrow_backend.compute_plan(data_processor.compile_instructions(df_instructions),
+                                                       df2_data)
+        self.assertEqual(set(recoded), {('s', repr({'h': 1, 'm': 2})), ('m', repr({'s': 1, 'n': 'no'}))})
+        self.assertEqual(set(profiles), {'e', 't'})
+        self.assertEqual(recoded[('m', repr({'s': 1, 'n': 'no'}))][1]['unmapped_keys'], {'z': 1, None: 1})
+        with self.assertRaises(ValueError):
+            data_processor.run_instructions(df_instructions, df2_data, backend='polars')
+
+    def test_profile_encoded(self):
+        column = pd.Series(['1', '2.5', 'na', None, 'x', '1'])
+        profile = arrow_backend.profile_encoded(column, *arrow_backend.encode_column(column))
+        expected = data_processor.profile_column(column)
+        pd.testing.assert_series_equal(profile.pop('values'), expected.pop('values'))
+        self.assertEqual(profile, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+import tempfile
+import unittest
+import pandas as pd
+import benchmark
+import data_processor
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_generate_dataset(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            fnames = benchmark.generate_dataset(tmp, rows=50, fields=10, cardinality=3)
+            df_instructions = pd.read_csv(fnames['instructions'])
+            df2_data = pd.read_csv(fnames['df2_data'])
+            self.assertEqual(len(df_instructions), 10)
+            self.assertEqual(len(df2_data), 50)
+            self.assertEqual(list(pd.read_csv(fnames['df2_dict']).columns),
+                             list(data_processor.create_dict().columns))
+            df2_data_new, df2_dict_new = data_processor.run_instructions(df_instructions, df2_data)
+            self.assertEqual(df2_data_new.shape, (50, 10))
+            self.assertEqual(len(df2_dict_new), 10)
+
+    def test_benchmark_scale(self):
+        result = benchmark.benchmark_scale(rows=100, fields=10, repeat=1)
+        self.assertEqual((result['rows'], result['fields']), (100, 10))
+        self.assertIn('end_to_end', result['seconds'])
+        self.assertIn('end_to_end_batch', result['seconds'])
+        self.assertIn('recode_group', result['seconds'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import data_processor
+import columnar_output
+
+
+@unittest.skipIf(columnar_output.pa is None, 'requiere pyarrow')
+class TestColumnar_Output(unittest.TestCase):
+    def test_write_columnar(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'peso', 'nota'],
+            'description_2014': ['Sexo', 'Edad', 'Peso', 'Nota'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Peso fmed', 'Nota fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M', 3: 'Otro'}}", None, None, "{'options': {}}"],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}", "{'actions': ['copy']}",
+                         "{'actions': ['copy']}", "{'actions': ['copy']}"],
+            'code_2014': ['s14', 'e14', 'p14', 'n14'],
+            'code_fmed_completo': ['s', 'e', 'p', 'n'],
+            'subcategoria': ['demo', 'demo', 'demo', 'otros'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'x'], 'e': ['20', '35', 'na'], 'p': ['60.5', '-1.25', '70'],
+                                 'n': ['a', 'b', 'c']})
+        df2_data_new, df2_dict_new = data_processor.run_instructions(df_instructions, df2_data)
+        for fname in ('datos.parquet', 'datos.feather'):
+            with tempfile.TemporaryDirectory() as tmp:
+                fname = os.path.join(tmp, fname)
+                columnar_output.write_columnar(df2_data_new, df2_dict_new, fname)
+                df_data, df_dict = columnar_output.read_columnar(fname)
+            self.assertEqual(list(df_data['sexo'].cat.categories), [1, 2, 3])
+            self.assertTrue(df_data['sexo'].isna().iloc[2])
+            self.assertEqual(df_data['edad'].dtype, 'Int8')
+            self.assertEqual(df_data['edad'].max(), 35)
+            self.assertEqual(df_data['peso'].dtype, np.float32)
+            self.assertEqual(df_data['nota'].tolist(), ['a', 'b', 'c'])
+            self.assertEqual(df_dict.loc[0, 'options'], {'options': {1: 'H', 2: 'M', 3: 'Otro'}})
+            self.assertEqual(df_dict.loc[1, 'options'], {'min': 20, 'max': 35})
+            self.assertEqual(df_dict['campo_unificado'].tolist(), ['sexo', 'edad', 'peso', 'nota'])
+
+    def test_write_columnar_free_text(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'tema'],
+            'description_2014': ['Sexo', 'Tema'],
+            'description_fmed': ['Sexo fmed', 'Tema fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}",
+                         "{'actions': ['copy', 'new_options'], 'new_options': {1: 'si', 2: 'no'}}"],
+            'code_2014': ['s14', 't14'],
+            'code_fmed_completo': ['s', 't'],
+            'subcategoria': ['demo', 'otros'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'h'], 't': ['texto libre', 'otro texto', None]})
+        df2_data_new, df2_dict_new = data_processor.run_instructions(df_instructions, df2_data)
+        for fname in ('datos.parquet', 'datos.feather'):
+            with tempfile.TemporaryDirectory() as tmp:
+                fname = os.path.join(tmp, fname)
+                columnar_output.write_columnar(df2_data_new, df2_dict_new, fname)
+                df_data, df_dict = columnar_output.read_columnar(fname)
+            self.assertEqual(list(df_data['sexo'].cat.categories), [1, 2])
+            self.assertNotIsInstance(df_data['tema'].dtype, pd.CategoricalDtype)
+            self.assertEqual(df_data['tema'].tolist()[:2], ['texto libre', 'otro texto'])
+            self.assertEqual(df_dict.loc[1, 'options'], {'options': {1: 'si', 2: 'no'}, 'is_category': 'true'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,7 @@
+import os
+import tempfile
 import unittest
+import numpy as np
 import pandas as pd
 import data_processor
 
@@ -31,6 +34,297 @@ class TestData_Processor(unittest.TestCase):
         result = data_processor.get_distribution(df2_data, df2_data_new, 'col1', 'new_col', how_recode)
         self.assertFalse(result)
 
+    def test_validate_recode(self):
+        df2_data = pd.DataFrame({'col1': ['a', 'a', 'b', 'c', 'd', None]})
+        df2_data_new = pd.DataFrame({'new_col': [1, 1, 2, 1, None, None]})
+        how_recode = {'a': 1, 'b': 2, 'c': 1}
+        report = data_processor.validate_recode(df2_data, df2_data_new, 'col1', 'new_col', how_recode)
+        self.assertEqual(report['count_keys']['a'], 2)
+        self.assertEqual(report['count_values'], {1: 3, 2: 1})
+        self.assertTrue(report['valid'])
+        self.assertEqual(report['unmapped_keys'], {'d': 1})
+        self.assertEqual(report['collisions'], {1: ['a', 'c']})
+
+    def test_run_instructions(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'tema'],
+            'description_2014': ['Sexo', 'Edad', 'Tema'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Tema fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}", "{'actions': ['copy']}",
+                         "{'actions': ['copy', 'new_options'], 'new_options': {1: 'si'}}"],
+            'code_2014': ['s14', 'e14', 't14'],
+            'code_fmed_completo': ['s', 'e', 't'],
+            'subcategoria': ['demo', 'demo', 'otros'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'm'], 'e': ['20', '35', 'na'], 't': ['1', '1', '1']})
+        df2_data_new, df2_dict_new = data_processor.run_instructions(df_instructions, df2_data)
+        self.assertEqual(list(df2_data_new.columns), ['sexo', 'edad', 'tema'])
+        self.assertEqual(df2_data_new['sexo'].tolist(), [1, 2, 2])
+        self.assertEqual(df2_data_new['edad'].max(), 35)
+        self.assertEqual(list(df2_dict_new.columns), list(data_processor.create_dict().columns))
+        self.assertEqual(df2_dict_new['campo_unificado'].tolist(), ['sexo', 'edad', 'tema'])
+        self.assertEqual(df2_dict_new.loc[1, 'options'],
+                         str({'min': df2_data_new['edad'].min(), 'max': df2_data_new['edad'].max()}))
+        self.assertEqual(df2_dict_new.loc[2, 'options'], str({'options': {1: 'si'}, 'is_category': 'true'}))
+
+    def test_run_instructions_low_memory(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'peso'],
+            'description_2014': ['Sexo', 'Edad', 'Peso'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Peso fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}", "{'actions': ['copy']}",
+                         "{'actions': ['copy']}"],
+            'code_2014': ['s14', 'e14', 'p14'],
+            'code_fmed_completo': ['s', 'e', 'p'],
+            'subcategoria': ['demo', 'demo', 'demo'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'm'], 'e': ['20', '35', 'na'], 'p': [60.5, 70.25, 80.0],
+                                 'otra': [1, 2, 3]})
+        expected = data_processor.run_instructions(df_instructions, df2_data.copy())
+        peso = df2_data['p'].to_numpy()
+        df2_data_new, df2_dict_new = data_processor.run_instructions(df_instructions, df2_data, low_memory=True)
+        pd.testing.assert_frame_equal(df2_data_new, expected[0], check_dtype=False)
+        pd.testing.assert_frame_equal(df2_dict_new, expected[1])
+        self.assertEqual(df2_data_new['edad'].dtype, 'Int8')
+        self.assertTrue(np.shares_memory(df2_data_new['peso'].to_numpy(), peso))
+        self.assertEqual(list(df2_data.columns), ['otra'])
+        self.assertGreater(data_processor.peak_memory(), 0)
+
+    def test_low_memory_copy_then_recode(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['edad', 'grupo'],
+            'description_2014': ['Edad', 'Grupo'],
+            'description_fmed': ['Edad fmed', 'Grupo fmed'],
+            'options': [None, "{'options': {'joven': 'Joven', 'adulto': 'Adulto'}}"],
+            'acciones': ["{'actions': ['copy']}", "{'actions': ['recode'], 'recode': {20: 'joven', 35: 'adulto'}}"],
+            'code_2014': ['e14', 'g14'],
+            'code_fmed_completo': ['e', 'e'],
+            'subcategoria': ['demo', 'demo'],
+        })
+        df2_data = pd.DataFrame({'e': ['20', '35', 'na']})
+        expected = data_processor.run_instructions(df_instructions, df2_data.copy())
+        df2_data_new, df2_dict_new = data_processor.run_instructions(df_instructions, df2_data, low_memory=True)
+        self.assertEqual(df2_data_new['grupo'].tolist()[:2], ['joven', 'adulto'])
+        self.assertTrue(pd.isna(df2_data_new['grupo'].iloc[2]))
+        self.assertEqual(df2_data_new['edad'].dtype, 'Int8')
+        pd.testing.assert_frame_equal(df2_data_new, expected[0], check_dtype=False)
+        pd.testing.assert_frame_equal(df2_dict_new, expected[1])
+
+    def test_run_plan_keeps_plan(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo'],
+            'description_2014': ['Sexo'],
+            'description_fmed': ['Sexo fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}"],
+            'acciones': ["{'actions': ['add_to_dict', 'recode'], 'add_to_dict': {3: 'Otro'}, "
+                         "'recode': {'h': 1, 'm': 2, 'o': 3}}"],
+            'code_2014': ['s14'],
+            'code_fmed_completo': ['s'],
+            'subcategoria': ['demo'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'o']})
+        plan = data_processor.compile_instructions(df_instructions, df2_data.columns)
+        _, df2_dict_new = data_processor.run_plan(plan, df2_data)
+        self.assertEqual(plan[0]['value_options'], {'options': {1: 'H', 2: 'M'}})
+        self.assertEqual(data_processor.parse_options(df2_dict_new.loc[0, 'options']),
+                         {'options': {1: 'H', 2: 'M', 3: 'Otro'}})
+
+    def test_run_instructions_chunked(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'ingreso', 'nota', 'hijos', 'genero', 'trabaja'],
+            'description_2014': ['Sexo', 'Edad', 'Ingreso', 'Nota', 'Hijos', 'Genero', 'Trabaja'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Ingreso fmed', 'Nota fmed', 'Hijos fmed',
+                                 'Genero fmed', 'Trabaja fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, None, "{'options': {}}", None,
+                        "{'options': {1: 'H', 2: 'M'}}", "{'options': {1: 'si', 0: 'no'}}"],
+            'acciones': ["{'actions': ['recode'], 'recode': {1: 'H', 2: 'M'}}", "{'actions': ['copy']}",
+                         "{'actions': ['copy']}", "{'actions': ['copy']}", "{'actions': ['copy']}",
+                         "{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}",
+                         "{'actions': ['recode_extend'], 'recode': {'s': 1, 'n': 0}}"],
+            'code_2014': ['s14', 'e14', 'i14', 'n14', 'h14', 'g14', 't14'],
+            'code_fmed_completo': ['s', 'e', 'i', 'n', 'h', 'g', 't'],
+            'subcategoria': ['demo', 'demo', 'demo', 'otros', 'demo', 'demo', 'demo'],
+        })
+        # 'i' es numerica en el primer bloque y tiene un string en el segundo; 'n' es mayormente texto;
+        # 'h' es entera en el primer bloque y tiene 'na' en el segundo; 'g' tiene un valor sin mapear y 't' un
+        # NaN solo en el segundo bloque
+        df2_data = pd.DataFrame({'s': [1, 2, 2, 1, 3, 2], 'e': [20, 35, None, 41, 18, 60],
+                                 'i': ['1.5', '200', '3', '-4', 'na', '7'],
+                                 'n': ['x', 'y', '1', 'z', 'w', 'v'], 'h': ['0', '2', '1', '3', 'na', '5'],
+                                 'g': ['h', 'm', 'h', 'm', 'x', 'h'], 't': ['s', 'n', 's', 's', None, 'n']})
+        with tempfile.TemporaryDirectory() as tmp:
+            data_fname = os.path.join(tmp, 'datos.csv')
+            output_fname = os.path.join(tmp, 'salida.csv')
+            df2_data.to_csv(data_fname, index=False)
+            expected_data, expected_dict = data_processor.run_instructions(df_instructions,
+                                                                           pd.read_csv(data_fname))
+            df2_dict_new = data_processor.run_instructions_chunked(df_instructions, data_fname, output_fname,
+                                                                   chunksize=4)
+            df2_data_new = pd.read_csv(output_fname)
+            with open(output_fname) as f:
+                self.assertEqual(f.read(), expected_data.to_csv(index=False))
+        pd.testing.assert_frame_equal(df2_dict_new, expected_dict)
+        pd.testing.assert_frame_equal(df2_data_new, expected_data, check_dtype=False)
+
+    def test_compile_instructions(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad'],
+            'description_2014': ['Sexo', 'Edad'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}", "{'actions': ['copy']}"],
+            'code_2014': ['s14', 'e14'],
+            'code_fmed_completo': ['s', 'e'],
+            'subcategoria': ['demo', 'demo'],
+        })
+        plan = data_processor.compile_instructions(df_instructions, ['s', 'e'])
+        self.assertEqual(plan[0]['action_list'], ('recode',))
+        self.assertEqual(plan[0]['recode'], {'h': 1, 'm': 2})
+        self.assertEqual(plan[1]['value_options'], {})
+        with self.assertRaises(ValueError):
+            data_processor.compile_instructions(df_instructions, ['s'])
+
+        df_instructions.loc[1, 'acciones'] = "{'actions': ['copiar']}"
+        with self.assertRaises(ValueError):
+            data_processor.compile_instructions(df_instructions)
+
+        df_instructions.loc[1, 'acciones'] = "{'actions': ['copy']}"
+        with tempfile.TemporaryDirectory() as tmp:
+            instructions_fname = os.path.join(tmp, 'instrucciones.csv')
+            df_instructions.to_csv(instructions_fname, index=False)
+            cache_dir = os.path.join(tmp, 'cache')
+            plan = data_processor.load_plan(instructions_fname, cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            self.assertEqual(data_processor.load_plan(instructions_fname, cache_dir), plan)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+
+    def test_recode_categorical(self):
+        column = pd.Series(['a', 'b', None, 'z', 'a', 'c'], name='col1')
+        how_recode = {'a': 1, 'b': 2, 'c': 1}
+        expected = column.map(how_recode)
+        recoded = data_processor.recode_categorical(column, how_recode, [2, 1, 3])
+        self.assertEqual(list(recoded.cat.categories), [2, 1, 3])
+        pd.testing.assert_series_equal(recoded.astype(expected.dtype), expected)
+
+        recoded = data_processor.recode_categorical(column.astype('category'), how_recode)
+        self.assertEqual(list(recoded.cat.categories), [1, 2])
+        pd.testing.assert_series_equal(recoded.astype(expected.dtype), expected)
+
+        df2_data = pd.DataFrame({'col1': column.astype('category')})
+        df2_data_new = pd.DataFrame({'new_col': recoded})
+        self.assertTrue(data_processor.get_distribution(df2_data, df2_data_new, 'col1', 'new_col', how_recode))
+
+    def test_profile_column(self):
+        column = pd.Series(['1.5', '-4', '200', 'na', None, 'abc'])
+        profile = data_processor.profile_column(column)
+        self.assertEqual((profile['numeric'], profile['string'], profile['null']), (3, 1, 2))
+        self.assertEqual((profile['min'], profile['max']), (-4, 200))
+
+        profile = data_processor.profile_column(pd.Series([3, None, 7]))
+        self.assertEqual((profile['numeric'], profile['string'], profile['null']), (2, 0, 1))
+        self.assertEqual((profile['min'], profile['max']), (3, 7))
+
+        df2_data = pd.DataFrame({'e': ['-1.5', '2', 'x']})
+        df2_data_new, options = data_processor.copy(df2_data, {}, 'edad', 'e', {})
+        self.assertEqual(options, {'min': -1.5, 'max': 2})
+        self.assertTrue(df2_data_new['edad'].isna().iloc[2])
+
+    def test_read_source(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'nota'],
+            'description_2014': ['Sexo', 'Edad', 'Nota'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Nota fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, None],
+            'acciones': ["{'actions': ['recode'], 'recode': {1: 'H', 2: 'M'}}", "{'actions': ['copy']}",
+                         "{'actions': ['new_options'], 'new_options': {1: 'si'}}"],
+            'code_2014': ['s14', 'e14', 'n14'],
+            'code_fmed_completo': ['s', 'e', 'n'],
+            'subcategoria': ['demo', 'demo', 'otros'],
+        })
+        df2_dict = pd.DataFrame({'category': ['demo', 'demo'], 'campo_unificado': ['s', 'e'],
+                                 'description': ['Sexo', 'Edad'],
+                                 'options': ["{'options': {1: 'H', 2: 'M'}}", "{'min': 0, 'max': 99}"]})
+        df2_data = pd.DataFrame({'s': [1, 2, 3, None], 'e': ['20', 'na', '35', '41'], 'n': ['a', 'b', 'c', 'd'],
+                                 'sin_usar': [1, 2, 3, 4]})
+        with tempfile.TemporaryDirectory() as tmp:
+            data_fname = os.path.join(tmp, 'datos.csv')
+            df2_data.to_csv(data_fname, index=False)
+            full = pd.read_csv(data_fname)
+            pruned = data_processor.read_source(data_fname, df_instructions, 'code_fmed_completo', df2_dict)
+        self.assertEqual(list(pruned.columns), ['s', 'e'])
+        self.assertEqual(list(pruned['s'].cat.categories), [1, 2, 3])
+        self.assertEqual(pruned['e'].dtype, 'float64')
+        expected_data, expected_dict = data_processor.run_instructions(df_instructions.iloc[:2], full)
+        df2_data_new, df2_dict_new = data_processor.run_instructions(df_instructions.iloc[:2], pruned)
+        pd.testing.assert_frame_equal(df2_dict_new, expected_dict)
+        pd.testing.assert_frame_equal(df2_data_new, expected_data)
+
+    def test_batch_recode(self):
+        how_recode = "{'actions': ['recode'], 'recode': {'s': 1, 'n': 2, 'x': 2}}"
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['p1', 'p2', 'p3', 'edad'],
+            'description_2014': ['P1', 'P2', 'P3', 'Edad'],
+            'description_fmed': ['P1 fmed', 'P2 fmed', 'P3 fmed', 'Edad fmed'],
+            'options': ["{'options': {1: 'si', 2: 'no'}}"] * 3 + [None],
+            'acciones': [how_recode, how_recode, how_recode.replace('recode', 'recode_extend', 1),
+                         "{'actions': ['copy']}"],
+            'code_2014': ['a14', 'b14', 'c14', 'e14'],
+            'code_fmed_completo': ['a', 'b', 'c', 'e'],
+            'subcategoria': ['demo'] * 4,
+        })
+        df2_data = pd.DataFrame({'a': ['s', 'n', None, 's'], 'b': ['n', 'n', 'x', 'z'], 'c': ['s', 's', 's', 's'],
+                                 'e': ['20', '35', 'na', '40']})
+        expected = data_processor.run_instructions(df_instructions, df2_data.copy())
+        batched = data_processor.run_instructions(df_instructions, df2_data.copy(), batch_recode=True)
+        pd.testing.assert_frame_equal(batched[0], expected[0])
+        pd.testing.assert_frame_equal(batched[1], expected[1])
+
+        results = data_processor.recode_group(df2_data, ['a', 'b'], {'s': 1, 'n': 2, 'x': 2})
+        df2_data_new = pd.DataFrame({'b': df2_data['b'].map({'s': 1, 'n': 2, 'x': 2})})
+        report = data_processor.validate_recode(df2_data, df2_data_new, 'b', 'b', {'s': 1, 'n': 2, 'x': 2})
+        self.assertEqual(results['b'][1], report)
+        self.assertEqual(results['b'][1]['unmapped_keys'], {'z': 1})
+        self.assertEqual(results['a'][0].tolist()[:2], [1, 2])
+
+        # las llaves del reporte conservan el tipo de su columna aunque 1 y 1.0 compartan la tabla
+        df_numeric = pd.DataFrame({'f': [1.0, 2.0, np.nan], 'i': [1, 2, 3]})
+        results = data_processor.recode_group(df_numeric, ['f', 'i'], {1: 'x', 2: 'y'})
+        self.assertEqual([type(key) for key in results['i'][1]['count_keys']], [int] * 3)
+        self.assertEqual([type(key) for key in results['f'][1]['count_keys']], [float] * 3)
+        self.assertEqual(results['i'][1]['unmapped_keys'], {3: 1})
+
+    def test_run_instructions_two_sources(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'solo_fmed', 'nota'],
+            'description_2014': ['Sexo', 'Edad', None, 'Nota'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Solo fmed', 'Nota fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, "{'options': {1: 'si', 2: 'no'}}", None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2, 'H': 1, 'M': 2}}",
+                         "{'actions': ['copy']}", "{'actions': ['recode'], 'recode': {'s': 1, 'n': 2}}",
+                         "{'actions': ['copy', 'new_options'], 'new_options': {1: 'si', 2: 'no'}}"],
+            'code_2014': ['sexo14', 'edad14', None, 'nota14'],
+            'code_fmed_completo': ['s', 'e', 'x', 'n'],
+            'subcategoria': ['demo', 'demo', 'otros', 'otros'],
+        })
+        # 'nota' es texto libre con opciones: no se convierte en categorica
+        df1_data = pd.DataFrame({'sexo14': ['H', 'M'], 'edad14': [18, 90], 'nota14': ['texto libre', 'sin dato']})
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'm'], 'e': ['20', '35', 'na'], 'x': ['s', 'n', 's'],
+                                 'n': ['otro', '2', 'comentario']})
+        df_unified, df_dict_new = data_processor.run_instructions_two_sources(df_instructions, df1_data, df2_data)
+        self.assertEqual(list(df_unified.columns), ['source', 'sexo', 'edad', 'solo_fmed', 'nota'])
+        self.assertEqual(df_unified['source'].tolist(), ['2014', '2014', 'fmed', 'fmed', 'fmed'])
+        self.assertEqual(df_unified['sexo'].tolist(), [1, 2, 1, 2, 2])
+        self.assertEqual(list(df_unified['sexo'].cat.categories), [1, 2])
+        self.assertEqual(list(df_unified['solo_fmed'].cat.categories), [1, 2])
+        self.assertTrue(df_unified['solo_fmed'].iloc[:2].isna().all())
+        self.assertEqual(df_unified['edad'].max(), 90)
+        self.assertNotIsInstance(df_unified['nota'].dtype, pd.CategoricalDtype)
+        self.assertEqual(df_unified['nota'].tolist(), ['texto libre', 'sin dato', 'otro', '2', 'comentario'])
+        self.assertEqual(data_processor.parse_options(df_dict_new.loc[1, 'options']), {'min': 18, 'max': 90})
+        self.assertEqual(df_dict_new.loc[0, 'options'], str({'options': {1: 'H', 2: 'M'}}))
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+import data_processor
+import dataset_profiler
+
+
+class TestDataset_Profiler(unittest.TestCase):
+    def test_profile_dataset(self):
+        df_data = pd.DataFrame({'edad': ['20', '35', 'na', '40', '18'], 'sexo': ['1', '2', '2', None, '99'],
+                                'nombre': ['ana', 'luis', 'eva', 'sol', 'ana'],
+                                'peso': ['60.5', '70', '80.25', '55', '90']})
+        df_dict = pd.DataFrame({'category': ['demo'], 'campo_unificado': ['sexo'], 'description': ['Sexo'],
+                                'options': [None]})
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'datos.csv')
+            df_data.to_csv(fname, index=False)
+            df_dict_new = dataset_profiler.profile_dataset(fname, chunksize=2, max_options=4, jobs=2,
+                                                           category='fmed', df_dict=df_dict)
+            self.assertTrue(df_dict_new.equals(dataset_profiler.profile_dataset(fname, max_options=4, jobs=1,
+                                                                                category='fmed', df_dict=df_dict)))
+        self.assertEqual(list(df_dict_new.columns), list(data_processor.create_dict().columns))
+        self.assertEqual(df_dict_new['campo_unificado'].tolist(), ['edad', 'sexo', 'nombre', 'peso'])
+        self.assertEqual(df_dict_new['category'].tolist(), ['fmed', 'demo', 'fmed', 'fmed'])
+        edad, sexo, nombre, peso = [data_processor.parse_options(options) for options in df_dict_new['options']]
+        self.assertEqual(edad['type'], 'str')
+        self.assertEqual((edad['min'], edad['max'], edad['null']), (18, 40, 1))
+        self.assertEqual(edad['options'], {18: '18', 20: '20', 35: '35', 40: '40'})
+        self.assertEqual(sexo['options'], {1: '1', 2: '2', 99: '99'})
+        self.assertEqual(sexo['counts'], {1: 1, 2: 2, 99: 1})
+        self.assertEqual((sexo['type'], sexo['null'], sexo['distinct']), ('float', 1, 3))
+        self.assertEqual(nombre['options'], {'ana': 'ana', 'eva': 'eva', 'luis': 'luis', 'sol': 'sol'})
+        self.assertNotIn('min', nombre)
+        self.assertEqual((peso['min'], peso['max']), (55, 90.0))
+        self.assertTrue(peso['approximate'])
+        self.assertEqual(peso['distinct'], 5)
+        self.assertNotIn('options', peso)
+
+    def test_profile_read_source(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad'],
+            'description_2014': ['Sexo', 'Edad'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None],
+            'acciones': ["{'actions': ['recode'], 'recode': {1: 'H', 2: 'M'}}", "{'actions': ['copy']}"],
+            'code_2014': ['s14', 'e14'],
+            'code_fmed_completo': ['s', 'e'],
+            'subcategoria': ['demo', 'demo'],
+        })
+        df_data = pd.DataFrame({'s': ['1', '2', '2', None], 'e': ['20.5', 'na', '35', '41']})
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'datos.csv')
+            df_data.to_csv(fname, index=False)
+            df_dict = dataset_profiler.profile_dataset(fname, max_options=2)
+            edad = data_processor.convert_to_dict(df_dict['options'].iloc[1], np.nan)[0]
+            self.assertEqual((edad['min'], edad['max']), (20.5, 41.0))
+            df_source = data_processor.read_source(fname, df_instructions, 'code_fmed_completo', df_dict)
+        self.assertEqual(list(df_source['s'].cat.categories), [1, 2])
+        self.assertEqual(df_source['e'].dtype, 'float64')
+
+    def test_distinct_sketch(self):
+        values = pd.Series([f'id{n}' for n in range(20000)])
+        sketch = dataset_profiler.DistinctSketch()
+        sketch.add(values.iloc[:12000])
+        other = dataset_profiler.DistinctSketch()
+        other.add(values.iloc[8000:])
+        other.add(values.iloc[8000:])
+        sketch.merge(other)
+        self.assertLess(abs(sketch.estimate() - 20000) / 20000, 0.05)
+        self.assertEqual(dataset_profiler.DistinctSketch().estimate(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
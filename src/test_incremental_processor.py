@@ -0,0 +1,43 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+import data_processor
+import incremental_processor
+
+
+class TestIncremental_Processor(unittest.TestCase):
+    def test_run_instructions_incremental(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'tema'],
+            'description_2014': ['Sexo', 'Edad', 'Tema'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Tema fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}", "{'actions': ['copy']}",
+                         "{'actions': ['new_options'], 'new_options': {1: 'si'}}"],
+            'code_2014': ['s14', 'e14', 't14'],
+            'code_fmed_completo': ['s', 'e', 't'],
+            'subcategoria': ['demo', 'demo', 'otros'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'm'], 'e': ['20', '35', 'na'], 't': ['1', '1', '1']})
+        with tempfile.TemporaryDirectory() as cache_dir:
+            expected = data_processor.run_instructions(df_instructions, df2_data.copy())
+            result = incremental_processor.run_instructions_incremental(df_instructions, df2_data.copy(), cache_dir)
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+            cached = incremental_processor.run_instructions_incremental(df_instructions, df2_data.copy(), cache_dir)
+            for frame, expected_frame in zip(result + cached, expected + expected):
+                pd.testing.assert_frame_equal(frame, expected_frame)
+
+            # solo cambia la fila de 'sexo': se recalcula un campo y el anterior se elimina del cache
+            df_instructions.loc[0, 'acciones'] = "{'actions': ['recode'], 'recode': {'h': 2, 'm': 1}}"
+            fingerprints = set(os.listdir(cache_dir))
+            df2_data_new, df2_dict_new = incremental_processor.run_instructions_incremental(df_instructions,
+                                                                                            df2_data.copy(), cache_dir)
+            self.assertEqual(len(set(os.listdir(cache_dir)) - fingerprints), 1)
+            self.assertEqual(len(os.listdir(cache_dir)), 3)
+            self.assertEqual(df2_data_new['sexo'].tolist(), [2, 1, 1])
+            pd.testing.assert_frame_equal(df2_dict_new, expected[1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import unittest
+import pandas as pd
+import data_processor
+import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def test_instrument(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad'],
+            'description_2014': ['Sexo', 'Edad'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}",
+                         "{'actions': ['copy', 'new_options'], 'new_options': {1: 'si'}}"],
+            'code_2014': ['s14', 'e14'],
+            'code_fmed_completo': ['s', 'e'],
+            'subcategoria': ['demo', 'demo'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'x'], 'e': ['20', '35', 'na']})
+        stdout = io.StringIO()
+        with contextlib.redirect_stdout(stdout), instrumentation.instrument() as recorder:
+            data_processor.run_instructions(df_instructions, df2_data)
+        self.assertEqual(stdout.getvalue(), '')
+        self.assertTrue(data_processor.VERBOSE)
+        self.assertIsNone(data_processor._RECORDER)
+
+        actions = recorder.to_frame()
+        self.assertEqual(actions['action'].tolist(), ['recode', 'copy', 'new_options'])
+        self.assertEqual(actions['rows'].tolist(), [3, 3, 3])
+        self.assertTrue(actions.loc[0, 'valid'])
+        self.assertEqual(actions.loc[0, 'unmapped_keys'], 1)
+        self.assertTrue((actions['memory_peak'] >= 0).all())
+        summary = recorder.field_summary()
+        self.assertEqual(set(summary['field']), {'sexo', 'edad'})
+        self.assertEqual(summary.set_index('field').loc['edad', 'actions'], 'copy,new_options')
+
+        with tempfile.TemporaryDirectory() as tmp:
+            recorder.write(os.path.join(tmp, 'reporte.json'))
+            with open(os.path.join(tmp, 'reporte.json')) as f:
+                report = json.load(f)
+            self.assertEqual(len(report['actions']), 3)
+            self.assertEqual(len(report['fields']), 2)
+            recorder.write(os.path.join(tmp, 'reporte.csv'))
+            self.assertEqual(len(pd.read_csv(os.path.join(tmp, 'reporte.csv'))), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import unittest
+import pandas as pd
+import data_processor
+import parallel_processor
+
+
+class TestParallel_Processor(unittest.TestCase):
+    def test_run_instructions_parallel(self):
+        df_instructions = pd.DataFrame({
+            'campo_unificado': ['sexo', 'edad', 'edad_grupo', 'tema'],
+            'description_2014': ['Sexo', 'Edad', 'Grupo', 'Tema'],
+            'description_fmed': ['Sexo fmed', 'Edad fmed', 'Grupo fmed', 'Tema fmed'],
+            'options': ["{'options': {1: 'H', 2: 'M'}}", None, None, None],
+            'acciones': ["{'actions': ['recode'], 'recode': {'h': 1, 'm': 2}}", "{'actions': ['copy']}",
+                         "{'actions': ['recode'], 'recode': {20: 'joven', 35: 'adulto'}}",
+                         "{'actions': ['new_options'], 'new_options': {1: 'si'}}"],
+            'code_2014': ['s14', 'e14', 'g14', 't14'],
+            'code_fmed_completo': ['s', 'e', 'e', 't'],
+            'subcategoria': ['demo', 'demo', 'demo', 'otros'],
+        })
+        df2_data = pd.DataFrame({'s': ['h', 'm', 'm'], 'e': ['20', '35', 'na'], 't': ['1', '1', '1']})
+        expected_data, expected_dict = data_processor.run_instructions(df_instructions, df2_data.copy())
+
+        plan = data_processor.compile_instructions(df_instructions)
+        shards = parallel_processor.shard_plan(plan, 2)
+        # las filas que leen 'e' quedan juntas y en orden
+        self.assertTrue(any(shard[:2] == [1, 2] for shard in shards))
+
+        df2_data_new, df2_dict_new = parallel_processor.run_instructions_parallel(df_instructions, df2_data, jobs=2)
+        pd.testing.assert_frame_equal(df2_data_new, expected_data)
+        pd.testing.assert_frame_equal(df2_dict_new, expected_dict)
+        self.assertEqual(df2_data['e'].max(), 35)
+
+
+if __name__ == '__main__':
+    unittest.main()
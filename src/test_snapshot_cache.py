@@ -0,0 +1,65 @@
+import os
+import tempfile
+import time
+import unittest
+import numpy as np
+import pandas as pd
+import snapshot_cache
+
+
+class TestSnapshot_Cache(unittest.TestCase):
+    def test_read_csv_cached(self):
+        df = pd.DataFrame({'a': [1, 2, None], 'b': ['x', None, 'z'], 'c': ['1', 'na', '3']})
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'datos.csv')
+            cache_dir = os.path.join(tmp, 'cache')
+            df.to_csv(fname, index=False)
+            expected = pd.read_csv(fname)
+            pd.testing.assert_frame_equal(snapshot_cache.read_csv_cached(fname, cache_dir), expected)
+            snapshots = sorted(os.listdir(cache_dir))
+            self.assertEqual(len(snapshots), 2)  # copia binaria + llave
+            pd.testing.assert_frame_equal(snapshot_cache.read_csv_cached(fname, cache_dir), expected)
+            self.assertEqual(sorted(os.listdir(cache_dir)), snapshots)
+
+            # otras opciones de lectura no reemplazan la copia anterior
+            usecols = snapshot_cache.read_csv_cached(fname, cache_dir, usecols=['a'])
+            pd.testing.assert_frame_equal(usecols, pd.read_csv(fname, usecols=['a']))
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+            # si cambia el CSV la copia se regenera y la anterior se elimina
+            time.sleep(0.01)
+            df.assign(a=[5, 6, np.nan]).to_csv(fname, index=False)
+            changed = snapshot_cache.read_csv_cached(fname, cache_dir)
+            self.assertEqual(changed['a'].max(), 6)
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+    def test_read_csv_cached_same_basename(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_dir = os.path.join(tmp, 'cache')
+            fnames = [os.path.join(tmp, folder, 'datos.csv') for folder in ('2014', 'fmed')]
+            for n, fname in enumerate(fnames):
+                os.makedirs(os.path.dirname(fname))
+                pd.DataFrame({'a': [n, n + 1]}).to_csv(fname, index=False)
+            for _ in range(2):
+                for n, fname in enumerate(fnames):
+                    self.assertEqual(snapshot_cache.read_csv_cached(fname, cache_dir)['a'].tolist(), [n, n + 1])
+            self.assertEqual(len(os.listdir(cache_dir)), 4)
+
+    def test_read_csv_cached_mixed_types(self):
+        # la columna 'a' queda como object con enteros y strings, como la deja pd.read_csv con DtypeWarning
+        df = pd.DataFrame({'a': [1, 2, 'x', 4], 'b': [1.5, 2.5, 3.5, 4.5]})
+        with tempfile.TemporaryDirectory() as tmp:
+            fname = os.path.join(tmp, 'datos.csv')
+            cache_dir = os.path.join(tmp, 'cache')
+            df.to_csv(fname, index=False)
+            read_kwargs = {'converters': {'a': lambda value: int(value) if value.isdigit() else value}}
+            expected = pd.read_csv(fname, **read_kwargs)
+            for _ in range(2):
+                pd.testing.assert_frame_equal(snapshot_cache.read_csv_cached(fname, cache_dir, **read_kwargs),
+                                              expected)
+            self.assertEqual(sorted(os.path.splitext(name)[1] for name in os.listdir(cache_dir)),
+                             ['.json', '.pkl'])
+
+
+if __name__ == '__main__':
+    unittest.main()